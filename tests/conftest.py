@@ -0,0 +1,8 @@
+import os
+import sys
+
+# The modules import each other flat (``from mission import ...``), as when run from waypoint/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'waypoint'))
+
+def pytest_configure(config):
+    config.addinivalue_line('markers', "timing: wall-clock bounds; deselect with -m 'not timing' on loaded machines")
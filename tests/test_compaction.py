@@ -0,0 +1,68 @@
+import math
+from compaction import CompactionStats, compact_items, compact_lines
+from mission import format_mission_lines, home_item, number_items, servo_item, takeoff_item, waypoint_item
+
+LAT, LON, ALT = 12.9351, 77.6103, 10.0
+
+def _point(east_m, north_m):
+    return LAT + north_m / 111_320.0, LON + east_m / (111_320.0 * math.cos(math.radians(LAT)))
+
+def _waypoints(items):
+    return [item for item in items if item.split('\t')[3] == '16']
+
+def _servos(items, channel):
+    return [float(item.split('\t')[5]) for item in items if item.split('\t')[3] == '183' and float(item.split('\t')[4]) == channel]
+
+def test_repeated_pwm_is_dropped():
+    items = [servo_item(9, 1500, 1), waypoint_item(*_point(0, 0), ALT), servo_item(9, 1500, 1),
+             waypoint_item(*_point(50, 50), ALT), servo_item(9, 1600, 1)]
+    stats = CompactionStats()
+    out = list(compact_items(items, stats=stats))
+    assert _servos(out, 9) == [1500, 1600]
+    assert len(_waypoints(out)) == 2
+    assert stats.servo_dropped == 1 and stats.items_after == stats.items_before - 1
+
+def test_prologue_and_epilogue_servos_on_other_channels_stay():
+    points = [_point(10 * i, 0) for i in range(5)]
+    lats, lons = [p[0] for p in points], [p[1] for p in points]
+    lines = list(format_mission_lines(points[0], [(lats, lons, [1500] * 5)], ALT, 9, 10, 1800, True))
+    items = [line[line.index('\t'):] for line in lines[1:]]
+    out = list(compact_items(items))
+    assert _servos(out, 10) == _servos(items, 10) == [1000, 1800, 1000]
+    assert _servos(out, 9) == [1000, 1500, 1000]
+    assert out[-2:] == items[-2:]
+
+def test_collinear_run_merges_only_within_tolerance():
+    # The second point is 0.5 m off the straight line through the others
+    points = [_point(0, 0), _point(10, 0.5), _point(20, 0), _point(30, 0)]
+    items = [waypoint_item(*p, ALT) for p in points]
+    assert len(_waypoints(compact_items(items, 0.1))) == 4
+    merged = _waypoints(compact_items(items, 1.0))
+    assert merged == [items[0], items[3]]
+    assert len(_waypoints(compact_items(items))) == 4  # Merging is off without a tolerance
+
+def test_merge_stops_at_an_altitude_change():
+    points = [_point(10 * i, 0) for i in range(4)]
+    items = [waypoint_item(*points[0], ALT), waypoint_item(*points[1], ALT),
+             waypoint_item(*points[2], ALT + 5), waypoint_item(*points[3], ALT + 5)]
+    assert len(_waypoints(compact_items(items, 1.0))) == 4
+
+def test_home_and_takeoff_never_merge():
+    points = [_point(10 * i, 0) for i in range(4)]
+    with_takeoff = [home_item(*points[0], ALT), takeoff_item(ALT)] + [waypoint_item(*p, ALT) for p in points[1:]]
+    out = list(compact_items(with_takeoff, 100.0))
+    assert out[:2] == with_takeoff[:2]
+    assert out[2:] == [with_takeoff[2], with_takeoff[4]]
+    without_takeoff = [home_item(*points[0], ALT)] + [waypoint_item(*p, ALT) for p in points[1:]]
+    out = list(compact_items(without_takeoff, 100.0))
+    assert out == [without_takeoff[0], without_takeoff[1], without_takeoff[3]]
+
+def test_seq_is_renumbered_contiguously():
+    points = [_point(10 * i, 0) for i in range(20)]
+    items = [home_item(*points[0], ALT), takeoff_item(ALT)]
+    for i, p in enumerate(points):
+        items += [waypoint_item(*p, ALT), servo_item(9, 1500 if i < 10 else 1600, 1)]
+    out = list(compact_lines(number_items(items), 1.0))
+    assert out[0] == "QGC WPL 110"
+    assert [int(line.split('\t')[0]) for line in out[1:]] == list(range(len(out) - 1))
+    assert len(out) - 1 < len(items)
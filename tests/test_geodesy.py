@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+from geopy.distance import geodesic
+from geodesy import WGS84_A, leg_distances
+
+LATITUDES = (-75.0, -33.9, 0.0, 12.9351, 45.0, 69.6)
+
+def _random_field(rng, lat, lon, n=300, max_step_m=60.0):
+    """A random walk of field points, with steps of up to ``max_step_m`` in each direction."""
+    north = np.cumsum(rng.uniform(-max_step_m, max_step_m, n))
+    east = np.cumsum(rng.uniform(-max_step_m, max_step_m, n))
+    lats = lat + np.degrees(north / WGS84_A)
+    lons = lon + np.degrees(east / (WGS84_A * np.cos(np.radians(lats))))
+    return lats, (lons + 180.0) % 360.0 - 180.0
+
+def _geopy_legs(lats, lons):
+    return np.array([geodesic(a, b).meters for a, b in zip(zip(lats[:-1], lons[:-1]), zip(lats[1:], lons[1:]))])
+
+@pytest.mark.parametrize('lon', [77.6103, 180.0])  # The second field straddles the antimeridian
+@pytest.mark.parametrize('lat', LATITUDES)
+def test_leg_distances_match_geopy(lat, lon):
+    lats, lons = _random_field(np.random.default_rng(abs(int(lat * 1000 + lon))), lat, lon)
+    expected = _geopy_legs(lats, lons)
+    assert np.max(np.abs(leg_distances(lats, lons, 'ellipsoidal') - expected)) < 1e-5
+    assert np.max(np.abs(leg_distances(lats, lons, 'fast') - expected) / expected) < 1e-6
+
+def test_antimeridian_field_crosses_it():
+    lats, lons = _random_field(np.random.default_rng(0), 0.0, 180.0)
+    assert lons.min() < -179 and lons.max() > 179
+
+def test_leg_distances_of_fewer_than_two_points_are_empty():
+    assert leg_distances([12.9], [77.6]).size == 0
+    assert leg_distances([], [], 'fast').size == 0
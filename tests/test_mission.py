@@ -0,0 +1,64 @@
+import pytest
+import mission
+from ingest import RejectReport
+from mission import generate_waypoints, iter_mission_lines, load_calibration_csv, write_mission
+from plan import build_plan
+from synthetic import synthetic_points, write_calibration_csv
+
+BAD_ROWS = {  # Row index -> rejected row, placed on chunk edges for the chunk sizes below
+    2: '3,4.5,"12.9351"',
+    3: '4,,"12.9351, 77.6103"',
+    6: '7,lots,"12.9351, 77.6103"',
+    7: '8,2.5,"north, east"',
+    13: '14,2.5,"95.0, 77.6103"',
+    20: '21,2.5,',
+}
+
+def _calibration(tmp_path):
+    path = tmp_path / "cal.csv"
+    write_calibration_csv(path)
+    return load_calibration_csv(path)
+
+def _header_only_csv(tmp_path):
+    path = tmp_path / "empty.csv"
+    path.write_text("Grids,Fertilizer,Target Coordinates\n")
+    return path
+
+def test_header_only_field_gives_prologue_and_epilogue(tmp_path):
+    lines = generate_waypoints(_header_only_csv(tmp_path), 10, 3, _calibration(tmp_path), 9, 10, 1500, True)
+    assert len(lines) == 8
+    assert lines[0] == "QGC WPL 110"
+
+@pytest.mark.parametrize('route_mode', ['csv', 'nearest'])
+def test_reader_without_chunks_gives_prologue_and_epilogue(tmp_path, monkeypatch, route_mode):
+    # pyarrow's streaming reader yields no batches at all for a header-only file
+    monkeypatch.setattr(mission, 'iter_field_chunks', lambda *args, **kwargs: iter(()))
+    lines = generate_waypoints(_header_only_csv(tmp_path), 10, 3, _calibration(tmp_path), 9, 10, 1500, True, route_mode=route_mode)
+    assert len(lines) == 8
+
+def test_header_only_field_plans_empty(tmp_path):
+    plan = build_plan(_header_only_csv(tmp_path), 10, 3, _calibration(tmp_path), 9, 10, 1500, True)
+    assert len(plan) == 0
+    assert plan.home == (0.0, 0.0)
+
+def _field_with_rejects(tmp_path, n=24):
+    lats, lons, grams = synthetic_points(n, seed=5)
+    rows = [f'{i + 1},{g},"{lat:.7f}, {lon:.7f}"' for i, (lat, lon, g) in enumerate(zip(lats, lons, grams))]
+    for index, row in BAD_ROWS.items():
+        rows[index] = row
+    path = tmp_path / "field.csv"
+    path.write_text("Grids,Fertilizer,Target Coordinates\n" + "\n".join(rows) + "\n")
+    return path
+
+@pytest.mark.parametrize('chunksize', [1, 2, 3, 7, 100])
+def test_streamed_output_matches_across_chunk_boundaries(tmp_path, chunksize):
+    field_csv, calibration = _field_with_rejects(tmp_path), _calibration(tmp_path)
+    expected = "\n".join(generate_waypoints(field_csv, 10, 3, calibration, 9, 10, 1500, True, rejects=RejectReport()))
+    rejects = RejectReport()
+    output_path = str(tmp_path / "field.waypoints")
+    write_mission(iter_mission_lines(field_csv, 10, 3, calibration, 9, 10, 1500, True, chunksize=chunksize, rejects=rejects),
+                  output_path, batch_lines=5)
+    with open(output_path, newline='') as infile:
+        assert infile.read() == expected
+    assert len(rejects) == len(BAD_ROWS)
+    assert expected.count("\n") + 1 == 8 + 2 * (24 - len(BAD_ROWS))
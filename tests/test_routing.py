@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+from routing import RouteStats, optimize_route
+from synthetic import synthetic_points
+
+MODES = ('nearest', 'boustrophedon')
+
+def _is_permutation(order, n):
+    return np.array_equal(np.sort(np.asarray(order)), np.arange(n))
+
+@pytest.mark.parametrize('mode', MODES)
+@pytest.mark.parametrize('n', [0, 1, 2, 3])
+def test_tiny_fields_give_a_permutation(mode, n):
+    lats, lons, _ = synthetic_points(n)
+    assert _is_permutation(optimize_route(lats, lons, mode), n)
+
+@pytest.mark.parametrize('mode', MODES)
+def test_duplicate_points_give_a_permutation(mode):
+    lats, lons, _ = synthetic_points(50)
+    lats, lons = np.repeat(lats, 3), np.repeat(lons, 3)
+    assert _is_permutation(optimize_route(lats, lons, mode), lats.size)
+
+@pytest.mark.parametrize('mode', MODES)
+def test_collinear_points_give_a_permutation(mode):
+    rng = np.random.default_rng(0)
+    t = rng.permutation(200) * 1e-5
+    lats, lons = 12.9 + t, 77.6 + 2 * t
+    assert _is_permutation(optimize_route(lats, lons, mode), lats.size)
+
+@pytest.mark.parametrize('n', [500, 30_000])  # Greedy walk and Hilbert seeding
+def test_nearest_tour_starts_at_the_first_point(n):
+    rng = np.random.default_rng(1)
+    lats, lons, _ = synthetic_points(n)
+    shuffled = np.concatenate(([0], rng.permutation(np.arange(1, n))))
+    order = optimize_route(lats[shuffled], lons[shuffled], 'nearest')
+    assert order[0] == 0
+    assert _is_permutation(order, n)
+
+@pytest.mark.parametrize('mode', MODES)
+def test_shuffled_grid_gets_no_longer(mode):
+    rng = np.random.default_rng(2)
+    lats, lons, _ = synthetic_points(2000)
+    shuffled = rng.permutation(lats.size)
+    stats = RouteStats()
+    optimize_route(lats[shuffled], lons[shuffled], mode, stats=stats)
+    assert stats.length_after <= stats.length_before
+    assert stats.length_after < 0.5 * stats.length_before
+
+@pytest.mark.timing
+def test_nearest_stays_under_a_second_at_100k_points():
+    rng = np.random.default_rng(3)
+    lats, lons, _ = synthetic_points(100_000)
+    shuffled = rng.permutation(lats.size)
+    stats = RouteStats()
+    order = optimize_route(lats[shuffled], lons[shuffled], 'nearest', stats=stats)
+    assert _is_permutation(order, lats.size)
+    assert stats.seconds < 1.0
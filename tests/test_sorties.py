@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+from geodesy import leg_distances, pairwise_distances
+from mission import load_calibration_csv
+from sorties import partition_sorties, plan_sorties, write_sortie
+from synthetic import synthetic_points, write_calibration_csv, write_field_csv
+
+ALTITUDE, SPEED = 10.0, 3.0
+
+def _field(tmp_path, n=400):
+    path = tmp_path / "field.csv"
+    write_field_csv(path, *synthetic_points(n))
+    return path
+
+def _plan(path, **limits):
+    return plan_sorties(path, ALTITUDE, SPEED, 9, 10, 1500, True, **limits)
+
+def _check_cover(sorties, n):
+    assert sorties[0].start == 0 and sorties[-1].stop == n
+    assert all(a.stop == b.start for a, b in zip(sorties, sorties[1:]))
+    assert all(len(sortie) > 0 for sortie in sorties)
+
+@pytest.mark.parametrize('limits', [
+    {'max_grams': 250.0},
+    {'max_items': 120},
+    {'max_flight_s': 240.0},
+    {'max_grams': 400.0, 'max_items': 200, 'max_flight_s': 300.0},
+])
+def test_sorties_cover_every_point_once_within_limits(tmp_path, limits):
+    home, sorties, _ = _plan(_field(tmp_path), **limits)
+    assert len(sorties) > 1
+    _check_cover(sorties, 400)
+    for sortie in sorties:
+        if 'max_grams' in limits:
+            assert sortie.grams.sum() <= limits['max_grams'] + 1e-9
+        if 'max_items' in limits:
+            assert sortie.item_count <= limits['max_items']
+        if 'max_flight_s' in limits:
+            # Home to the first point, along the legs, and back home from the last point
+            out, back = pairwise_distances([home[0]] * 2, [home[1]] * 2, sortie.lats[[0, -1]], sortie.lons[[0, -1]])
+            path = out + leg_distances(sortie.lats, sortie.lons).sum() + back
+            assert path / SPEED <= limits['max_flight_s'] + 1e-6
+            assert sortie.flight_s == pytest.approx(path / SPEED)
+
+def test_sorties_are_as_long_as_the_limit_allows(tmp_path):
+    _, sorties, _ = _plan(_field(tmp_path), max_grams=250.0)
+    for sortie, following in zip(sorties, sorties[1:]):
+        assert sortie.grams.sum() + following.grams[0] > 250.0
+
+def test_written_sortie_has_the_counted_items(tmp_path):
+    cal_csv = tmp_path / "cal.csv"
+    write_calibration_csv(cal_csv)
+    home, sorties, _ = _plan(_field(tmp_path), max_items=120)
+    path = str(tmp_path / "sortie.waypoints")
+    write_sortie(sorties[0], path, home, ALTITUDE, SPEED, load_calibration_csv(cal_csv), 9, 10, 1500, True)
+    with open(path) as infile:
+        assert len(infile.read().splitlines()) - 1 == sorties[0].item_count
+
+def test_single_point_over_the_limit_is_an_error():
+    with pytest.raises(ValueError):
+        partition_sorties((12.9, 77.6), np.array([12.9]), np.array([77.6]), np.array([50.0]), np.zeros(0), SPEED, 7, max_grams=10.0)
+
+def test_empty_field_gives_one_empty_sortie(tmp_path):
+    path = tmp_path / "empty.csv"
+    path.write_text("Grids,Fertilizer,Target Coordinates\n")
+    _, sorties, _ = _plan(path, max_grams=100.0)
+    assert len(sorties) == 1 and len(sorties[0]) == 0
+    assert sorties[0].item_count == 7  # Home, takeoff, three servo inits and two shutdowns
@@ -0,0 +1,35 @@
+import pytest
+from mission import generate_waypoints, load_calibration_csv
+from mock_autopilot import MockAutopilot
+from synthetic import synthetic_points, write_calibration_csv, write_field_csv
+from upload import mission_items, send_mission
+
+def _generated_items(tmp_path, n):
+    field_csv, cal_csv = tmp_path / "field.csv", tmp_path / "cal.csv"
+    write_field_csv(field_csv, *synthetic_points(n))
+    write_calibration_csv(cal_csv)
+    return mission_items(generate_waypoints(field_csv, 10, 3, load_calibration_csv(cal_csv), 9, 10, 1500, True))
+
+def _connection(vehicle):
+    return f"udpout:{vehicle.address[0]}:{vehicle.address[1]}"
+
+def test_generated_mission_verifies_against_stored_items(tmp_path):
+    # The mock keeps only what ArduCopter keeps (e.g. no param3 or frame on DO_SET_SERVO)
+    items = _generated_items(tmp_path, 200)
+    with MockAutopilot() as vehicle:
+        stats = send_mission(_connection(vehicle), items)
+    assert stats.verified
+    assert len(vehicle.items) == len(items)
+
+@pytest.mark.parametrize('loss', [0.05, 0.15])
+def test_upload_and_read_back_survive_packet_loss(tmp_path, loss):
+    items = _generated_items(tmp_path, 1500)  # 3007 items
+    with MockAutopilot(loss=loss, seed=7) as vehicle:
+        stats = send_mission(_connection(vehicle), items)
+    print(stats)
+    assert stats.verified
+    assert stats.sent == len(items) + stats.retransmits
+    # A lost packet costs a stall-triggered resend, not a whole timeout: about 0.2 and 0.7 resends per item
+    # at 5% and 15% loss here, with at most a few timeouts where hundreds of losses would otherwise each cost one
+    assert 0 < stats.retransmits < 8 * loss * len(items)
+    assert stats.timeouts < 10
@@ -0,0 +1,201 @@
+"""Headless batch CLI: generate .waypoints files for many field CSVs in parallel.
+
+Usage example::
+
+    python batch.py fields/ "extra/*.csv" --calibration cal.csv --out-dir missions/
+
+Only the GUI-free ``mission`` core is imported here so startup stays fast and
+worker processes never touch tkinter, matplotlib or PIL.
+"""
+import argparse
+import glob
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from compaction import CompactionStats, compact_lines
+from geodesy import DISTANCE_MODES
+from ingest import FERTILIZER_COLUMN, FieldFormat, RejectReport
+from mission import load_calibration_csv, iter_mission_lines, write_mission
+from profiling import StageProfile
+from routing import DEFAULT_TIME_BUDGET, ROUTE_MODES, RouteStats
+from sorties import plan_sorties, sortie_path, write_sortie
+
+def collect_inputs(patterns):
+    """Expand directories and glob patterns into a sorted, de-duplicated list of CSV paths."""
+    paths = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            paths.update(glob.glob(os.path.join(pattern, '*.csv')))
+        else:
+            paths.update(p for p in glob.glob(pattern) if os.path.isfile(p))
+    return sorted(paths)
+
+def output_path_for(input_csv, out_dir):
+    """Return the .waypoints path for an input CSV, next to it unless out_dir is given."""
+    stem = os.path.splitext(os.path.basename(input_csv))[0]
+    return os.path.join(out_dir or os.path.dirname(input_csv), stem + '.waypoints')
+
+def rejects_path_for(output_path):
+    """Return the rejected-rows report written next to ``output_path``, e.g. ``field.rejects.csv``."""
+    return os.path.splitext(output_path)[0] + '.rejects.csv'
+
+def profile_path_for(output_path):
+    """Return the stage profile written next to ``output_path``, e.g. ``field.profile.json``."""
+    return os.path.splitext(output_path)[0] + '.profile.json'
+
+def _summarize_rejects(rejects, output_path, save):
+    if save and len(rejects):
+        rejects.write_csv(rejects_path_for(output_path))
+    return f"; {rejects}" if len(rejects) else ""
+
+def process_file(input_csv, output_path, altitude, speed, cal_points, valve_servo_channel, disc_servo_channel, disc_pwm, include_takeoff, distance_mode='ellipsoidal', pwm_resolution=None, compact=False, merge_tolerance_m=None, route_mode='csv', route_budget=DEFAULT_TIME_BUDGET, field_format=None, save_rejects=False, save_profile=False):
+    """Generate and write one mission; runs inside a worker process. Returns a one-line summary."""
+    route_stats = RouteStats()
+    rejects = RejectReport()
+    profile = StageProfile()
+    with profile.run():
+        lines = iter_mission_lines(input_csv, altitude, speed, cal_points, valve_servo_channel, disc_servo_channel, disc_pwm, include_takeoff, distance_mode, pwm_resolution,
+                                   route_mode=route_mode, route_budget=route_budget, route_stats=route_stats,
+                                   field_format=field_format, rejects=rejects, profile=profile)
+        if compact:
+            stats = CompactionStats()
+            write_mission(compact_lines(lines, merge_tolerance_m, stats), output_path, profile=profile)
+            summary = str(stats)
+        else:
+            summary = f"{write_mission(lines, output_path, profile=profile) - 1} items"  # Header line is not a mission item
+    if save_profile:
+        profile.write_json(profile_path_for(output_path), input=input_csv, output=output_path, route_mode=route_mode,
+                           compact=compact)
+    if route_mode != 'csv':
+        summary += f"; {route_stats}"
+    return summary + _summarize_rejects(rejects, output_path, save_rejects)
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Generate ArduPilot .waypoints files for many field CSVs.")
+    parser.add_argument('inputs', nargs='+', help="Field CSV files, directories or glob patterns")
+    parser.add_argument('-c', '--calibration', required=True, help="Calibration CSV with Valve and Avg quantity(g) columns")
+    parser.add_argument('-o', '--out-dir', help="Output directory (default: next to each input CSV)")
+    parser.add_argument('--altitude', type=float, default=10.0, help="Altitude in metres (default: 10)")
+    parser.add_argument('--speed', type=float, default=3.0, help="Speed in m/s (default: 3)")
+    parser.add_argument('--valve-channel', type=int, default=9, help="Valve servo channel 1-16 (default: 9)")
+    parser.add_argument('--disc-channel', type=int, default=10, help="Disc servo channel 1-16 (default: 10)")
+    parser.add_argument('--disc-pwm', type=float, default=1500, help="Disc PWM 1000-2000 (default: 1500)")
+    parser.add_argument('--no-takeoff', action='store_true', help="Omit the MAV_CMD_NAV_TAKEOFF item")
+    parser.add_argument('--coord-column', default=None,
+                        help="Column holding \"lat, lon\" (default: 'Target Coordinates' or 'Midpoint', whichever exists)")
+    parser.add_argument('--fertilizer-column', default=FERTILIZER_COLUMN,
+                        help=f"Column holding grams per point (default: {FERTILIZER_COLUMN})")
+    parser.add_argument('--delimiter', default=',', help="CSV field delimiter (default: ,)")
+    parser.add_argument('--coord-separator', default=',', help="Separator between lat and lon in the coordinate column (default: ,)")
+    parser.add_argument('--reject-report', action='store_true',
+                        help="Write the rows left out of each field to <output>.rejects.csv")
+    parser.add_argument('--profile', action='store_true',
+                        help="Write per-stage timings of each mission to <output>.profile.json (not with sortie limits)")
+    parser.add_argument('--distance-mode', choices=DISTANCE_MODES, default='ellipsoidal',
+                        help="Leg distance accuracy: full WGS-84 ellipsoid or fast tangent-plane approximation")
+    parser.add_argument('--pwm-resolution', type=float, default=None,
+                        help="Quantize valve PWMs to this step (us) using a precomputed lookup table")
+    parser.add_argument('--route', choices=ROUTE_MODES, default=None,
+                        help="Visit order: CSV row order, optimized nearest-neighbour tour or lawnmower sweep "
+                             "(default: csv, or nearest when splitting into sorties)")
+    parser.add_argument('--route-budget', type=float, default=DEFAULT_TIME_BUDGET, metavar='SECONDS',
+                        help=f"Time limit for --route nearest (default: {DEFAULT_TIME_BUDGET})")
+    parser.add_argument('--compact', action='store_true',
+                        help="Drop DO_SET_SERVO items that repeat the channel's last PWM")
+    parser.add_argument('--merge-tolerance', type=float, default=None, metavar='M',
+                        help="With --compact, also merge waypoints within M metres of a straight leg at the same PWM")
+    parser.add_argument('--max-grams', type=float, default=None,
+                        help="Split into sorties carrying at most this much fertilizer (one hopper load)")
+    parser.add_argument('--max-flight-time', type=float, default=None, metavar='SECONDS',
+                        help="Split into sorties whose flight from home and back fits in this time at --speed")
+    parser.add_argument('--max-items', type=int, default=None,
+                        help="Split into sorties of at most this many mission items (flight controller limit)")
+    parser.add_argument('-j', '--jobs', type=int, default=None, help="Worker processes (default: all cores)")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    inputs = collect_inputs(args.inputs)
+    if not inputs:
+        print("No input CSV files found", file=sys.stderr)
+        return 2
+    try:
+        cal_points = load_calibration_csv(args.calibration)
+    except Exception as e:
+        print(f"Failed to read calibration CSV: {e}", file=sys.stderr)
+        return 2
+    try:
+        field_format = FieldFormat(args.coord_column, args.fertilizer_column, args.delimiter, args.coord_separator)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    if args.out_dir:
+        os.makedirs(args.out_dir, exist_ok=True)
+    split = any(limit is not None for limit in (args.max_grams, args.max_flight_time, args.max_items))
+    if split and args.profile:
+        print("--profile is not supported together with sortie limits", file=sys.stderr)
+        return 2
+    route = args.route or ('nearest' if split else 'csv')
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        if split:
+            failures = _run_sorties(pool, inputs, args, route, cal_points, field_format)
+        else:
+            failures = _run_files(pool, inputs, args, route, cal_points, field_format)
+    print(f"{len(inputs) - failures} succeeded, {failures} failed")
+    return 1 if failures else 0
+
+def _run_files(pool, inputs, args, route, cal_points, field_format):
+    """Generate one mission per input; returns the number of failed inputs."""
+    failures = 0
+    futures = {}
+    for input_csv in inputs:
+        output_path = output_path_for(input_csv, args.out_dir)
+        future = pool.submit(process_file, input_csv, output_path, args.altitude, args.speed, cal_points,
+                             args.valve_channel, args.disc_channel, args.disc_pwm, not args.no_takeoff, args.distance_mode,
+                             args.pwm_resolution, args.compact, args.merge_tolerance, route, args.route_budget,
+                             field_format, args.reject_report, args.profile)
+        futures[future] = (input_csv, output_path)
+    for future in as_completed(futures):
+        input_csv, output_path = futures[future]
+        try:
+            print(f"OK    {input_csv} -> {output_path} ({future.result()})")
+        except Exception as e:
+            failures += 1
+            print(f"FAIL  {input_csv}: {e}")
+    return failures
+
+def _run_sorties(pool, inputs, args, route, cal_points, field_format):
+    """Plan each input's sorties, then write every sortie as its own job; returns the number of failed inputs."""
+    failed = set()
+    plans = {pool.submit(plan_sorties, input_csv, args.altitude, args.speed, args.valve_channel, args.disc_channel,
+                         args.disc_pwm, not args.no_takeoff, args.distance_mode, route, args.max_grams,
+                         args.max_flight_time, args.max_items, field_format): input_csv for input_csv in inputs}
+    writes = {}
+    for future in as_completed(plans):
+        input_csv = plans[future]
+        try:
+            home, sorties, rejects = future.result()
+        except Exception as e:
+            failed.add(input_csv)
+            print(f"FAIL  {input_csv}: {e}")
+            continue
+        output_path = output_path_for(input_csv, args.out_dir)
+        print(f"PLAN  {input_csv}: {len(sorties)} sorties{_summarize_rejects(rejects, output_path, args.reject_report)}")
+        for sortie in sorties:
+            path = sortie_path(output_path, sortie.number, len(sorties))
+            write = pool.submit(write_sortie, sortie, path, home, args.altitude, args.speed, cal_points, args.valve_channel,
+                                args.disc_channel, args.disc_pwm, not args.no_takeoff, args.distance_mode,
+                                args.pwm_resolution, args.compact, args.merge_tolerance)
+            writes[write] = (input_csv, path)
+    for future in as_completed(writes):
+        input_csv, path = writes[future]
+        try:
+            print(f"OK    {input_csv} -> {path} ({future.result()})")
+        except Exception as e:
+            failed.add(input_csv)
+            print(f"FAIL  {input_csv} -> {path}: {e}")
+    return len(failed)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,177 @@
+"""Benchmark suite: how each stage of the generation pipeline scales with field size.
+
+Usage example::
+
+    python bench.py                                     # 1k, 100k and 1M points
+    python bench.py --sizes 1000 100000 --save-baseline bench_baseline.json
+    python bench.py --sizes 1000 100000 --baseline bench_baseline.json   # exit status 1 on a regression
+
+For each size a synthetic field and calibration (see ``synthetic``) are
+written to a temporary directory. Each stage then runs on its own, fed by the
+stages before it:
+
+=================  ==========================================================
+calibration        ``load_calibration_csv``
+read               reading the CSV in chunks (``ingest.iter_field_chunks``)
+parse              coordinate and fertilizer parsing (``ingest.parse_points``)
+distances          leg distances and flight times
+pwms               ``Calibration.assign_pwms`` for every point
+interpolate_pwm    the per-point ``interpolate_pwm`` API, on at most 1000 points
+format             QGC WPL 110 lines
+write              ``write_mission``
+render             ``plot_plan`` on an off-screen figure, saved as PNG
+=================  ==========================================================
+
+Times are the best of ``--repeat`` runs. With ``--memory`` every stage runs
+once more under tracemalloc to record its peak allocation. Baselines are
+machine specific: save one with ``--save-baseline`` on the machine that will
+run the checks. A stage counts as a regression when it is slower (or uses more
+memory) than the baseline by more than ``--tolerance`` and by more than the
+noise floor.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import tracemalloc
+import numpy as np
+import matplotlib
+matplotlib.use('Agg')
+from matplotlib.figure import Figure
+from geodesy import leg_distances
+from ingest import RejectReport, iter_field_chunks, parse_points
+from mission import format_mission_lines, interpolate_pwm, leg_times, load_calibration_csv, write_mission
+from plan import MissionPlan
+from plotting import plot_plan
+from profiling import StageProfile
+from synthetic import synthetic_points, write_calibration_csv, write_field_csv
+
+DEFAULT_SIZES = (1_000, 100_000, 1_000_000)
+DEFAULT_REPEAT = 3
+DEFAULT_TOLERANCE = 0.25
+NOISE_FLOOR_S = 0.01
+NOISE_FLOOR_BYTES = 1 << 20
+INTERPOLATE_SAMPLE = 1000
+ALTITUDE, SPEED, VALVE_CHANNEL, DISC_CHANNEL, DISC_PWM = 10.0, 3.0, 9, 10, 1500.0
+
+def _parse_all(chunks):
+    parsed = [parse_points(df, None, RejectReport()) for df in chunks]
+    return tuple(np.concatenate(column) for column in zip(*parsed))
+
+def _render(lats, lons, grams, pwms):
+    # plot_plan only needs the points and PWMs, so the plan is built directly instead of re-parsing the CSV
+    plan = MissionPlan((float(lats[0]), float(lons[0])), lats, lons, grams, None, None, pwms, [], [], None)
+    fig = Figure(figsize=(10, 8))
+    plot_plan(plan, DISC_PWM, fig=fig)
+    fig.savefig(io.BytesIO(), format='png', dpi=100)
+
+def stage_steps(field_csv, cal_csv, mission_path):
+    """Return the benchmark's (stage, function) pairs; each function takes the results of the earlier stages."""
+    return [
+        ('calibration', lambda r: load_calibration_csv(cal_csv)),
+        ('read', lambda r: list(iter_field_chunks(field_csv))),
+        ('parse', lambda r: _parse_all(r['read'])),
+        ('distances', lambda r: leg_times(leg_distances(r['parse'][0], r['parse'][1]), SPEED)),
+        ('pwms', lambda r: r['calibration'].assign_pwms(r['parse'][2], r['distances'])),
+        ('interpolate_pwm', lambda r: [interpolate_pwm(g, t, r['calibration']) for g, t in
+                                       zip(r['parse'][2][:INTERPOLATE_SAMPLE].tolist(), r['distances'][:INTERPOLATE_SAMPLE].tolist())]),
+        ('format', lambda r: list(format_mission_lines(
+            (float(r['parse'][0][0]), float(r['parse'][1][0])), [(r['parse'][0].tolist(), r['parse'][1].tolist(), r['pwms'])],
+            ALTITUDE, VALVE_CHANNEL, DISC_CHANNEL, DISC_PWM, True))),
+        ('write', lambda r: write_mission(r['format'], mission_path)),
+        ('render', lambda r: _render(*r['parse'], r['pwms'])),
+    ]
+
+def bench_size(n, workdir, repeat=DEFAULT_REPEAT, memory=False, seed=0):
+    """Return {stage: {'seconds': best time, 'peak_bytes': peak allocation or None}} for an ``n``-point field."""
+    field_csv = os.path.join(workdir, f"field_{n}.csv")
+    cal_csv = os.path.join(workdir, "calibration.csv")
+    write_field_csv(field_csv, *synthetic_points(n, seed=seed))
+    write_calibration_csv(cal_csv, seed)
+    steps = stage_steps(field_csv, cal_csv, os.path.join(workdir, f"field_{n}.waypoints"))
+    best = {}
+    for _ in range(repeat):
+        profile, results = StageProfile(), {}
+        for name, step in steps:
+            with profile.stage(name):
+                results[name] = step(results)
+        for name, seconds in profile.seconds.items():
+            best[name] = min(best.get(name, seconds), seconds)
+    peaks = {}
+    if memory:
+        results = {}
+        tracemalloc.start()
+        try:
+            for name, step in steps:
+                before = tracemalloc.get_traced_memory()[0]
+                tracemalloc.reset_peak()
+                results[name] = step(results)
+                peaks[name] = tracemalloc.get_traced_memory()[1] - before
+        finally:
+            tracemalloc.stop()
+    return {name: {'seconds': seconds, 'peak_bytes': peaks.get(name)} for name, seconds in best.items()}
+
+def find_regressions(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Return a message for every stage in ``results`` that is worse than in ``baseline`` beyond the tolerance."""
+    regressions = []
+    for size, stages in results.items():
+        for name, now in stages.items():
+            base = baseline.get(size, {}).get(name)
+            if base is None:
+                continue
+            if now['seconds'] > base['seconds'] * (1 + tolerance) and now['seconds'] - base['seconds'] > NOISE_FLOOR_S:
+                regressions.append(f"{size} points, {name}: {now['seconds']:.3f} s vs {base['seconds']:.3f} s baseline")
+            if (now['peak_bytes'] is not None and base.get('peak_bytes') is not None
+                    and now['peak_bytes'] > base['peak_bytes'] * (1 + tolerance)
+                    and now['peak_bytes'] - base['peak_bytes'] > NOISE_FLOOR_BYTES):
+                regressions.append(f"{size} points, {name}: {now['peak_bytes'] / 2**20:.1f} MB vs "
+                                   f"{base['peak_bytes'] / 2**20:.1f} MB baseline")
+    return regressions
+
+def format_table(results):
+    rows = [f"{'points':>9}  {'stage':<16}{'seconds':>9}{'points/s':>12}{'peak MB':>10}"]
+    for size, stages in results.items():
+        for name, stats in stages.items():
+            rate = int(size) / stats['seconds'] if stats['seconds'] > 0 and name not in ('calibration', 'interpolate_pwm') else None
+            peak = f"{stats['peak_bytes'] / 2**20:.1f}" if stats['peak_bytes'] is not None else "-"
+            rows.append(f"{size:>9}  {name:<16}{stats['seconds']:>9.3f}{f'{rate:,.0f}' if rate else '-':>12}{peak:>10}")
+    return "\n".join(rows)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time each generation stage on synthetic fields.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES), help="Field sizes in points (default: 1000 100000 1000000)")
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help=f"Runs per size; the best time counts (default: {DEFAULT_REPEAT})")
+    parser.add_argument('--memory', action='store_true', help="Also record each stage's peak allocation (extra run)")
+    parser.add_argument('--seed', type=int, default=0, help="Seed for the synthetic data (default: 0)")
+    parser.add_argument('--json', metavar='PATH', help="Write the results as JSON")
+    parser.add_argument('--save-baseline', metavar='PATH', help="Write the results as a baseline for later --baseline checks")
+    parser.add_argument('--baseline', metavar='PATH', help="Compare against a saved baseline; exit status 1 on a regression")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help=f"Allowed slowdown or memory growth as a fraction (default: {DEFAULT_TOLERANCE})")
+    args = parser.parse_args(argv)
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='waypoint-bench-') as workdir:
+        for n in args.sizes:
+            results[str(n)] = bench_size(n, workdir, max(args.repeat, 1), args.memory, args.seed)
+            print(f"{n:,} points done", file=sys.stderr)
+    print(format_table(results))
+    report = {'python': platform.python_version(), 'machine': platform.machine(), 'results': results}
+    for path in (args.json, args.save_baseline):
+        if path:
+            with open(path, 'w', encoding='utf-8') as outfile:
+                json.dump(report, outfile, indent=2)
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as infile:
+            regressions = find_regressions(results, json.load(infile)['results'], args.tolerance)
+        for message in regressions:
+            print(f"REGRESSION  {message}")
+        if regressions:
+            return 1
+        print(f"No regressions beyond {args.tolerance:.0%} of the baseline")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,112 @@
+"""Precompiled valve calibration: vectorized dispense-rate to PWM mapping.
+
+A ``Calibration`` is built once from the ``Valve`` / ``Avg quantity(g)`` curve
+and can then map whole arrays of target rates to PWMs with a binary search per
+value, so it can be reused across fields and sorties without any setup cost.
+"""
+import hashlib
+import numpy as np
+import pandas as pd
+
+class Calibration:
+    """Valve PWM vs. flow rate curve with a precomputed inverse (rate -> PWM) table."""
+
+    def __init__(self, pwms, rates):
+        pwms = np.asarray(pwms, dtype=float)
+        rates = np.asarray(rates, dtype=float)
+        if pwms.shape != rates.shape or pwms.ndim != 1:
+            raise ValueError("Calibration needs matching 1-D PWM and rate sequences")
+        order = np.argsort(pwms, kind='stable')
+        pwms, rates = pwms[order], rates[order]
+        if not (np.all(np.isfinite(pwms)) and np.all(np.isfinite(rates))):
+            raise ValueError("Calibration values must be finite numbers")
+        if np.any(np.diff(pwms) == 0):
+            raise ValueError("Calibration contains duplicate Valve PWM values")
+        if np.any(np.diff(rates) <= 0):
+            raise ValueError("Calibration flow rate must strictly increase with Valve PWM")
+        self.pwms = pwms
+        self.rates = rates
+        self.slopes = np.diff(pwms) / np.diff(rates)
+        self.min_pwm = pwms[0] if pwms.size else 1000
+        self.max_pwm = pwms[-1] if pwms.size else 2000
+        self._tables = {}
+
+    @classmethod
+    def from_points(cls, cal_points):
+        """Build from a {pwm: rate} dict as returned by earlier versions of load_calibration_csv."""
+        return cls(list(cal_points.keys()), list(cal_points.values()))
+
+    @classmethod
+    def from_csv(cls, cal_csv):
+        """Load from a CSV with Valve and Avg quantity(g) columns.
+
+        Raises ValueError if the columns are missing or the curve is not monotonic.
+        """
+        df = pd.read_csv(cal_csv)
+        if 'Valve' not in df.columns or 'Avg quantity(g)' not in df.columns:
+            raise ValueError("CSV must contain 'Valve' and 'Avg quantity(g)' columns")
+        # Later rows win on duplicate PWMs, matching the old dict-based loader
+        points = dict(zip(df['Valve'].astype(float), df['Avg quantity(g)'].astype(float)))
+        return cls.from_points(points)
+
+    def __len__(self):
+        return self.pwms.size
+
+    def fingerprint(self):
+        """Return a hex digest identifying this curve, for use in cache keys."""
+        return hashlib.sha256(self.pwms.tobytes() + b'|' + self.rates.tobytes()).hexdigest()
+
+    def pwm_for_rates(self, target_rates):
+        """Map target dispense rates (g/s) to interpolated, unclamped float PWMs.
+
+        Rates outside the curve clamp to the end PWMs; NaN maps to the maximum PWM.
+        """
+        target = np.asarray(target_rates, dtype=float)
+        if self.pwms.size == 0:
+            return np.full(target.shape, 1000.0)
+        if self.pwms.size == 1:
+            return np.where(target < self.rates[0], self.min_pwm, self.max_pwm)
+        idx = np.clip(np.searchsorted(self.rates, target, side='left') - 1, 0, self.slopes.size - 1)
+        result = self.pwms[idx] + self.slopes[idx] * (target - self.rates[idx])
+        result = np.where(target < self.rates[0], self.min_pwm, result)
+        return np.where((target > self.rates[-1]) | np.isnan(target), self.max_pwm, result)
+
+    def lookup_table(self, resolution=1):
+        """Return (rate_thresholds, pwm_levels) quantized to the controller's PWM resolution.
+
+        ``pwm_levels[i]`` is the PWM to command for rates in
+        ``[rate_thresholds[i], rate_thresholds[i + 1])``. Tables are cached per resolution.
+        """
+        if resolution not in self._tables:
+            if resolution <= 0:
+                raise ValueError("PWM resolution must be positive")
+            levels = np.arange(self.min_pwm, self.max_pwm + resolution / 2, resolution)
+            thresholds = np.interp(levels, self.pwms, self.rates)
+            self._tables[resolution] = (thresholds, levels)
+        return self._tables[resolution]
+
+    def assign_pwms(self, grams, time_seconds, resolution=None):
+        """Return integer valve PWMs for arrays of grams and leg times.
+
+        Matches the per-row rule of ``generate_waypoints``: rate is grams/time
+        (or grams when time is not positive), the interpolated PWM is truncated
+        and clamped to the calibration range. With ``resolution`` the quantized
+        lookup table is used instead, rounding down to the nearest PWM step.
+        """
+        grams = np.asarray(grams, dtype=float)
+        time_seconds = np.asarray(time_seconds, dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            target = np.where(time_seconds > 0, grams / time_seconds, grams)
+        if resolution is None or not len(self):
+            pwms = np.trunc(self.pwm_for_rates(target))
+        else:
+            thresholds, levels = self.lookup_table(resolution)
+            idx = np.clip(np.searchsorted(thresholds, target, side='right') - 1, 0, levels.size - 1)
+            pwms = np.where(np.isnan(target), levels[-1], levels[idx])
+        return np.clip(pwms, self.min_pwm, self.max_pwm).astype(int)
+
+def as_calibration(cal_points):
+    """Return ``cal_points`` as a Calibration, converting a {pwm: rate} dict if needed."""
+    if isinstance(cal_points, Calibration):
+        return cal_points
+    return Calibration.from_points(cal_points)
@@ -0,0 +1,101 @@
+"""Mission compaction: drop redundant MAV_CMD_DO_SET_SERVO items and merge collinear legs.
+
+Works on a stream of mission items (QGC WPL 110 lines without their seq
+field, as yielded by ``MissionPlan.iter_items``) and only holds back one
+waypoint plus the points merged into it, so it fits the streaming pipeline:
+
+* a DO_SET_SERVO (183) whose PWM equals the last PWM sent on that channel is
+  dropped, since the servo is already there;
+* with ``merge_tolerance_m``, a grid NAV_WAYPOINT (16) is dropped when no
+  command follows it and it, along with any waypoints already merged away,
+  lies within the tolerance of the straight leg that replaces them. No servo
+  change happens there, so the dispense rate along the leg is unchanged.
+
+Sequence numbers are reassigned on output by ``number_items``.
+"""
+import math
+from geodesy import WGS84_A, WGS84_E2
+from mission import number_items
+
+MAV_CMD_NAV_WAYPOINT = 16
+MAV_CMD_DO_SET_SERVO = 183
+MAX_MERGE_RUN = 1000  # Caps the points re-checked against each new leg
+
+class CompactionStats:
+    """Before/after item counts, filled in as a compaction stream is consumed."""
+
+    def __init__(self):
+        self.items_before = 0
+        self.items_after = 0
+        self.servo_dropped = 0
+        self.waypoints_merged = 0
+
+    def __str__(self):
+        return (f"{self.items_before} -> {self.items_after} items "
+                f"({self.servo_dropped} servo commands dropped, {self.waypoints_merged} waypoints merged)")
+
+def _cross_track_m(a, b, c):
+    """Distance in metres from point ``b`` to segment ``a``-``c`` on a tangent plane at ``a``."""
+    lat0 = math.radians(a[0])
+    w2 = 1 - WGS84_E2 * math.sin(lat0) ** 2
+    north = math.radians(1) * WGS84_A * (1 - WGS84_E2) / w2 ** 1.5
+    east = math.radians(1) * WGS84_A / math.sqrt(w2) * math.cos(lat0)
+    bx, by = (b[1] - a[1]) * east, (b[0] - a[0]) * north
+    cx, cy = (c[1] - a[1]) * east, (c[0] - a[0]) * north
+    length2 = cx * cx + cy * cy
+    t = 0.0 if length2 == 0 else max(0.0, min(1.0, (bx * cx + by * cy) / length2))
+    return math.hypot(bx - t * cx, by - t * cy)
+
+def compact_items(items, merge_tolerance_m=None, stats=None):
+    """Yield ``items`` without redundant servo commands and, optionally, with collinear waypoints merged.
+
+    Pass a CompactionStats as ``stats`` to read the counts once the stream is exhausted.
+    """
+    if stats is None:
+        stats = CompactionStats()
+    last_pwm = {}
+    anchor = None    # (lat, lon, alt) of the last emitted grid waypoint a merged leg may start from
+    pending = None   # (item, point) of the grid waypoint held back in case the next one replaces it
+    skipped = []     # Points already merged away between anchor and pending
+
+    def emit(item):
+        stats.items_after += 1
+        return item
+
+    for item in items:
+        stats.items_before += 1
+        fields = item.split('\t')  # fields[0] is empty: the seq field is not there
+        command = int(fields[3])
+        if command == MAV_CMD_DO_SET_SERVO:
+            channel, pwm = float(fields[4]), float(fields[5])
+            if last_pwm.get(channel) == pwm:
+                stats.servo_dropped += 1
+                continue
+            last_pwm[channel] = pwm
+        if merge_tolerance_m is not None and command == MAV_CMD_NAV_WAYPOINT and fields[1] == '0':
+            point = (float(fields[8]), float(fields[9]), fields[10])
+            if (anchor is not None and pending is not None and anchor[2] == pending[1][2] == point[2]
+                    and len(skipped) < MAX_MERGE_RUN
+                    and all(_cross_track_m(anchor, p, point) <= merge_tolerance_m for p in skipped + [pending[1]])):
+                skipped.append(pending[1])
+                stats.waypoints_merged += 1
+            elif pending is not None:
+                yield emit(pending[0])
+                anchor, skipped = pending[1], []
+            pending = (item, point)
+            continue
+        if pending is not None:
+            yield emit(pending[0])
+            anchor, skipped, pending = pending[1], [], None
+        if command != MAV_CMD_DO_SET_SERVO:
+            # Home, takeoff and other commands end any leg; a servo change does not move the vehicle
+            anchor = None
+        yield emit(item)
+    if pending is not None:
+        yield emit(pending[0])
+
+def compact_lines(lines, merge_tolerance_m=None, stats=None):
+    """Compact QGC WPL 110 ``lines`` (header first) and yield them renumbered."""
+    lines = iter(lines)
+    next(lines, None)  # Header
+    return number_items(compact_items((line[line.index('\t'):] for line in lines), merge_tolerance_m, stats))
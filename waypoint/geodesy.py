@@ -0,0 +1,110 @@
+"""Batched leg-distance computation on NumPy arrays of latitude/longitude.
+
+Two accuracy modes are available:
+
+``'ellipsoidal'``
+    Vincenty's inverse formula on the WGS-84 ellipsoid, vectorised over all legs.
+    Agrees with ``geopy.distance.geodesic`` to well below a millimetre; the rare
+    legs that fail to converge (near-antipodal points) fall back to geopy.
+
+``'fast'``
+    Local tangent plane: each leg is projected onto a plane using the WGS-84
+    meridional and prime-vertical radii of curvature at the leg's mean latitude.
+    For legs up to 10 km away from the poles the relative error against the
+    ellipsoidal distance stays below 1e-6 (under 1 mm per km), which is far below
+    GPS accuracy at field scale. Do not use it for legs of hundreds of kilometres.
+"""
+import numpy as np
+
+WGS84_A = 6378137.0
+WGS84_F = 1 / 298.257223563
+WGS84_B = WGS84_A * (1 - WGS84_F)
+WGS84_E2 = WGS84_F * (2 - WGS84_F)
+
+DISTANCE_MODES = ('ellipsoidal', 'fast')
+
+def _vincenty(lat1, lon1, lat2, lon2, max_iter=200, tol=1e-12):
+    """Vectorised Vincenty inverse; returns (distances_m, converged_mask)."""
+    a, b, f = WGS84_A, WGS84_B, WGS84_F
+    L = np.radians(lon2 - lon1)
+    U1 = np.arctan((1 - f) * np.tan(np.radians(lat1)))
+    U2 = np.arctan((1 - f) * np.tan(np.radians(lat2)))
+    sinU1, cosU1 = np.sin(U1), np.cos(U1)
+    sinU2, cosU2 = np.sin(U2), np.cos(U2)
+    lam = L.copy()
+    converged = np.zeros(L.shape, dtype=bool)
+    for _ in range(max_iter):
+        sin_lam, cos_lam = np.sin(lam), np.cos(lam)
+        sin_sigma = np.hypot(cosU2 * sin_lam, cosU1 * sinU2 - sinU1 * cosU2 * cos_lam)
+        cos_sigma = sinU1 * sinU2 + cosU1 * cosU2 * cos_lam
+        sigma = np.arctan2(sin_sigma, cos_sigma)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            sin_alpha = np.where(sin_sigma == 0, 0.0, cosU1 * cosU2 * sin_lam / sin_sigma)
+            cos2_alpha = 1 - sin_alpha ** 2
+            cos_2sigma_m = np.where(cos2_alpha == 0, 0.0, cos_sigma - 2 * sinU1 * sinU2 / cos2_alpha)
+        C = f / 16 * cos2_alpha * (4 + f * (4 - 3 * cos2_alpha))
+        lam_prev = lam
+        lam = L + (1 - C) * f * sin_alpha * (
+            sigma + C * sin_sigma * (cos_2sigma_m + C * cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)))
+        converged = np.abs(lam - lam_prev) <= tol
+        if converged.all():
+            break
+    u2 = cos2_alpha * (a ** 2 - b ** 2) / b ** 2
+    A = 1 + u2 / 16384 * (4096 + u2 * (-768 + u2 * (320 - 175 * u2)))
+    B = u2 / 1024 * (256 + u2 * (-128 + u2 * (74 - 47 * u2)))
+    delta_sigma = B * sin_sigma * (cos_2sigma_m + B / 4 * (
+        cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)
+        - B / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma ** 2) * (-3 + 4 * cos_2sigma_m ** 2)))
+    distances = b * A * (sigma - delta_sigma)
+    return np.where(sin_sigma == 0, 0.0, distances), converged
+
+def _tangent_plane(lat1, lon1, lat2, lon2):
+    """Flat-earth distance using WGS-84 radii of curvature at the mean latitude."""
+    mean_lat = np.radians((lat1 + lat2) / 2)
+    w2 = 1 - WGS84_E2 * np.sin(mean_lat) ** 2
+    meridional = WGS84_A * (1 - WGS84_E2) / w2 ** 1.5
+    prime_vertical = WGS84_A / np.sqrt(w2)
+    dlon = (lon2 - lon1 + 180.0) % 360.0 - 180.0
+    north = np.radians(lat2 - lat1) * meridional
+    east = np.radians(dlon) * prime_vertical * np.cos(mean_lat)
+    return np.hypot(north, east)
+
+def pairwise_distances(lat1, lon1, lat2, lon2, mode='ellipsoidal'):
+    """Distances in metres between matching elements of two coordinate arrays."""
+    lat1, lon1, lat2, lon2 = (np.asarray(v, dtype=float) for v in (lat1, lon1, lat2, lon2))
+    if mode == 'fast':
+        return _tangent_plane(lat1, lon1, lat2, lon2)
+    if mode != 'ellipsoidal':
+        raise ValueError(f"Unknown distance mode {mode!r}; expected one of {DISTANCE_MODES}")
+    distances, converged = _vincenty(lat1, lon1, lat2, lon2)
+    if not converged.all():
+        from geopy.distance import geodesic
+        for i in np.flatnonzero(~converged):
+            distances[i] = geodesic((lat1[i], lon1[i]), (lat2[i], lon2[i])).meters
+    return distances
+
+def leg_distances(lats, lons, mode='ellipsoidal'):
+    """Return the N-1 consecutive leg lengths in metres for N points along a path."""
+    lats = np.asarray(lats, dtype=float)
+    lons = np.asarray(lons, dtype=float)
+    if lats.size < 2:
+        return np.zeros(0)
+    return pairwise_distances(lats[:-1], lons[:-1], lats[1:], lons[1:], mode)
+
+def local_xy(lats, lons):
+    """Project points to (east, north) metres on a tangent plane at their mean position.
+
+    Uses the same radii of curvature as the ``'fast'`` mode; meant for
+    field-scale geometry such as route ordering, not for long distances.
+    """
+    lats = np.asarray(lats, dtype=float)
+    lons = np.asarray(lons, dtype=float)
+    if lats.size == 0:
+        return np.zeros(0), np.zeros(0)
+    lat0, lon0 = lats.mean(), lons.mean()
+    w2 = 1 - WGS84_E2 * np.sin(np.radians(lat0)) ** 2
+    meridional = WGS84_A * (1 - WGS84_E2) / w2 ** 1.5
+    prime_vertical = WGS84_A / np.sqrt(w2)
+    east = np.radians((lons - lon0 + 180.0) % 360.0 - 180.0) * prime_vertical * np.cos(np.radians(lat0))
+    north = np.radians(lats - lat0) * meridional
+    return east, north
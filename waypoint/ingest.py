@@ -0,0 +1,212 @@
+"""Field CSV ingestion: chunked reading and vectorized, validated coordinate parsing.
+
+Each chunk is parsed column-wise with pandas string operations instead of row
+by row. Rows that cannot be used are not dropped silently: they are counted
+and described in a ``RejectReport`` that callers surface or save. The coordinate
+and fertilizer column names, the CSV delimiter and the separator inside the
+coordinate cell are set by a ``FieldFormat``. By default the coordinate column
+is whichever of ``COORDINATE_COLUMNS`` the file has.
+
+Reading uses pyarrow's streaming CSV reader when pyarrow is installed and
+falls back to pandas' C parser in ``chunksize`` row chunks otherwise.
+"""
+import csv
+import re
+import numpy as np
+import pandas as pd
+
+DEFAULT_CHUNK_ROWS = 50_000
+COORDINATE_COLUMNS = ('Target Coordinates', 'Midpoint')
+FERTILIZER_COLUMN = 'Fertilizer'
+COORDINATE_REASONS = (None, "expected two coordinate values", "non-numeric coordinate", "coordinate not finite",
+                      "latitude out of range", "missing coordinates")
+ARROW_BYTES_PER_ROW = 64  # Rough CSV row size used to turn ``chunksize`` into a pyarrow block size
+
+class FieldFormat:
+    """Column names and separators of a field CSV; ``coordinate_column=None`` picks from COORDINATE_COLUMNS."""
+
+    def __init__(self, coordinate_column=None, fertilizer_column=FERTILIZER_COLUMN, delimiter=',', coordinate_separator=','):
+        if not delimiter or not coordinate_separator:
+            raise ValueError("Delimiter and coordinate separator must not be empty")
+        self.coordinate_column = coordinate_column
+        self.fertilizer_column = fertilizer_column
+        self.delimiter = delimiter
+        self.coordinate_separator = coordinate_separator
+
+    def _key(self):
+        return (self.coordinate_column, self.fertilizer_column, self.delimiter, self.coordinate_separator)
+
+    def __eq__(self, other):
+        return isinstance(other, FieldFormat) and self._key() == other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def columns(self, header):
+        """Return the (coordinate, fertilizer) column names to read from ``header``.
+
+        Raises ValueError naming the expected columns if either is missing.
+        """
+        candidates = (self.coordinate_column,) if self.coordinate_column else COORDINATE_COLUMNS
+        coordinate = next((name for name in candidates if name in header), None)
+        if coordinate is None:
+            raise ValueError(f"CSV has no coordinate column; expected {' or '.join(map(repr, candidates))}")
+        if self.fertilizer_column not in header:
+            raise ValueError(f"CSV has no {self.fertilizer_column!r} column")
+        return coordinate, self.fertilizer_column
+
+class RejectReport:
+    """Rows left out of a field, with the reason for each; filled in as chunks are parsed.
+
+    ``rows`` keeps (row, reason, value) for the first ``max_rows`` rejections,
+    where ``row`` is the 0-based data row (file line ``row + 2``) and ``value``
+    the offending cell. ``counts`` covers every rejection.
+    """
+
+    def __init__(self, max_rows=1000):
+        self.max_rows = max_rows
+        self.rows_read = 0
+        self.counts = {}
+        self.rows = []
+
+    def __len__(self):
+        return sum(self.counts.values())
+
+    def __str__(self):
+        if not self.counts:
+            return f"{self.rows_read} rows, none rejected"
+        reasons = ", ".join(f"{count} {reason}" for reason, count in self.counts.items())
+        return f"{len(self)} of {self.rows_read} rows rejected ({reasons})"
+
+    def add(self, reason, rows, values):
+        """Record the rows at positions ``rows`` of ``values`` (a Series indexed by data row) as rejected."""
+        if not len(rows):
+            return
+        self.counts[reason] = self.counts.get(reason, 0) + len(rows)
+        room = self.max_rows - len(self.rows)
+        if room > 0:
+            kept = values.iloc[rows[:room]]
+            self.rows.extend((int(row), reason, value) for row, value in zip(kept.index, kept.tolist()))
+
+    def details(self, limit=10):
+        """Return up to ``limit`` lines such as ``row 7: non-numeric coordinate ('abc')``."""
+        return [f"row {row}: {reason} ({value!r})" for row, reason, value in self.rows[:limit]]
+
+    def write_csv(self, path):
+        """Write the kept rejections to ``path`` as row,reason,value."""
+        with open(path, 'w', newline='', encoding='utf-8') as outfile:
+            writer = csv.writer(outfile)
+            writer.writerow(['row', 'reason', 'value'])
+            writer.writerows(self.rows)
+
+def _pyarrow_csv():
+    """Return ``pyarrow.csv``, or None if pyarrow is not installed."""
+    try:
+        from pyarrow import csv as arrow_csv
+    except ImportError:
+        return None
+    return arrow_csv
+
+def _arrow_chunks(arrow_csv, input_csv, columns, field_format, chunksize):
+    import pyarrow as pa
+    reader = arrow_csv.open_csv(
+        input_csv,
+        read_options=arrow_csv.ReadOptions(block_size=max(chunksize * ARROW_BYTES_PER_ROW, 1 << 20)),
+        parse_options=arrow_csv.ParseOptions(delimiter=field_format.delimiter),
+        # Read both columns as text so a bad value in a later block cannot clash with an inferred type
+        convert_options=arrow_csv.ConvertOptions(include_columns=list(columns), column_types={c: pa.string() for c in columns}))
+    offset = 0
+    for batch in reader:
+        df = batch.to_pandas()
+        df.index = pd.RangeIndex(offset, offset + len(df))
+        offset += len(df)
+        yield df
+
+def iter_field_chunks(input_csv, chunksize=DEFAULT_CHUNK_ROWS, field_format=None):
+    """Yield the coordinate and fertilizer columns of ``input_csv`` as DataFrames (index is the global data row).
+
+    With pyarrow installed chunks are pyarrow blocks of roughly ``chunksize``
+    rows, otherwise exactly ``chunksize`` rows. Raises ValueError if the
+    header lacks the configured columns; read errors propagate.
+    """
+    field_format = field_format or FieldFormat()
+    header = pd.read_csv(input_csv, sep=field_format.delimiter, nrows=0).columns
+    columns = field_format.columns(header)
+    arrow_csv = _pyarrow_csv()
+    if arrow_csv is not None:
+        yield from _arrow_chunks(arrow_csv, input_csv, columns, field_format, chunksize)
+        return
+    with pd.read_csv(input_csv, sep=field_format.delimiter, usecols=list(columns), dtype={columns[0]: str},
+                     chunksize=chunksize) as reader:
+        yield from reader
+
+def _to_float(values):
+    """Parse a Series exactly as ``float()`` would; unparsable or missing entries become NaN."""
+    if pd.api.types.is_numeric_dtype(values):
+        return values.to_numpy(dtype=float)
+    values = values.str.strip()
+    try:
+        return values.astype(float).to_numpy()
+    except (TypeError, ValueError):
+        # pd.to_numeric only finds the bad entries: it may round differently from float()
+        numeric = pd.to_numeric(values, errors='coerce').notna().to_numpy()
+        parsed = np.full(len(values), np.nan)
+        parsed[numeric] = values[numeric].astype(float).to_numpy()
+        return parsed
+
+def split_coordinates(coordinates, separator=','):
+    """Return (lats, lons, reason) for a Series of ``"lat<separator>lon"`` strings.
+
+    ``reason`` is a per-row code: 0 for usable, otherwise an index into
+    ``COORDINATE_REASONS``.
+    """
+    if coordinates.empty:
+        # str.partition on an empty Series returns a frame without columns
+        return np.empty(0), np.empty(0), np.empty(0, dtype=np.int8)
+    text = coordinates.astype(str).where(coordinates.notna())
+    two_values = (text.str.count(re.escape(separator)) == 1).to_numpy()
+    parts = text.str.partition(separator).reindex(columns=range(3))  # An all-missing chunk gives fewer columns
+    lats, lons = _to_float(parts[0]), _to_float(parts[2])
+    reason = np.zeros(len(text), dtype=np.int8)
+    with np.errstate(invalid='ignore'):
+        reason[np.abs(lats) > 90] = 4
+        reason[np.isinf(lats) | np.isinf(lons)] = 3
+        reason[np.isnan(lats) | np.isnan(lons)] = 2
+    reason[~two_values] = 1
+    reason[coordinates.isna().to_numpy()] = 5
+    return lats, lons, reason
+
+def parse_points(df, field_format=None, report=None):
+    """Return (lats, lons, grams) arrays for the usable rows of a chunk, in file order.
+
+    Rows with missing, malformed or out-of-range coordinates (|lat| > 90) or a
+    missing or non-numeric fertilizer value are left out and recorded in
+    ``report`` (a RejectReport) if given.
+    """
+    field_format = field_format or FieldFormat()
+    coordinate_column, fertilizer_column = field_format.columns(df.columns)
+    coordinates, fertilizer = df[coordinate_column], df[fertilizer_column]
+    lats, lons, reason = split_coordinates(coordinates, field_format.coordinate_separator)
+    grams = _to_float(fertilizer)
+    bad_grams = (reason == 0) & np.isnan(grams)
+    if report is not None:
+        report.rows_read += len(df)
+        for code in range(1, len(COORDINATE_REASONS)):
+            report.add(COORDINATE_REASONS[code], np.flatnonzero(reason == code), coordinates)
+        missing = fertilizer.isna().to_numpy()
+        report.add("missing fertilizer", np.flatnonzero(bad_grams & missing), fertilizer)
+        report.add("non-numeric fertilizer", np.flatnonzero(bad_grams & ~missing), fertilizer)
+    keep = (reason == 0) & ~bad_grams
+    return lats[keep], lons[keep], grams[keep]
+
+def home_position(df, field_format=None):
+    """Return (lat, lon) of the chunk's first row, or (0.0, 0.0) if it cannot be parsed."""
+    if df.empty:
+        return 0.0, 0.0
+    field_format = field_format or FieldFormat()
+    coordinate_column, _ = field_format.columns(df.columns)
+    lats, lons, reason = split_coordinates(df[coordinate_column].iloc[:1], field_format.coordinate_separator)
+    if reason[0] in (0, 4):
+        # The old row-wise parser accepted any numeric home position, even an out-of-range one
+        return float(lats[0]), float(lons[0])
+    return 0.0, 0.0
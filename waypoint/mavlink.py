@@ -0,0 +1,240 @@
+"""Minimal MAVLink 2 codec and links for the mission protocol.
+
+Only the handful of ``common.xml`` messages a mission transfer needs are
+implemented, so uploads work without pymavlink. Frames are sent as MAVLink 2
+(unsigned); MAVLink 1 and signed MAVLink 2 frames are accepted on receive.
+Unknown messages and frames with a bad checksum are skipped.
+
+Connections are given as ``udpin:HOST:PORT`` (listen, e.g. for a vehicle or
+MAVProxy sending to the ground station), ``udpout:HOST:PORT`` (send first, e.g.
+to SITL or ``mock_autopilot``) or a serial device such as ``/dev/ttyUSB0`` or
+``COM3``, optionally followed by ``:BAUD``. Serial links need pyserial, which
+is imported only when one is opened.
+"""
+import socket
+import struct
+import time
+
+STX_V1 = 0xFE
+STX_V2 = 0xFD
+INCOMPAT_SIGNED = 0x01
+SIGNATURE_LEN = 13
+GCS_SYSTEM_ID = 255
+GCS_COMPONENT_ID = 190  # MAV_COMP_ID_MISSIONPLANNER
+MAV_TYPE_GCS = 6
+MAV_AUTOPILOT_INVALID = 8
+DEFAULT_BAUD = 57600
+
+# msgid: (name, CRC_EXTRA, struct format in wire order, field names); extension fields last
+MESSAGES = {
+    0: ('HEARTBEAT', 50, '<IBBBBB', ('custom_mode', 'type', 'autopilot', 'base_mode', 'system_status', 'mavlink_version')),
+    40: ('MISSION_REQUEST', 230, '<HBBB', ('seq', 'target_system', 'target_component', 'mission_type')),
+    43: ('MISSION_REQUEST_LIST', 132, '<BBB', ('target_system', 'target_component', 'mission_type')),
+    44: ('MISSION_COUNT', 221, '<HBBB', ('count', 'target_system', 'target_component', 'mission_type')),
+    47: ('MISSION_ACK', 153, '<BBBB', ('target_system', 'target_component', 'type', 'mission_type')),
+    51: ('MISSION_REQUEST_INT', 196, '<HBBB', ('seq', 'target_system', 'target_component', 'mission_type')),
+    73: ('MISSION_ITEM_INT', 38, '<ffffiifHHBBBBBB', ('param1', 'param2', 'param3', 'param4', 'x', 'y', 'z', 'seq', 'command',
+                                                    'target_system', 'target_component', 'frame', 'current',
+                                                    'autocontinue', 'mission_type')),
+}
+MESSAGE_IDS = {spec[0]: msgid for msgid, spec in MESSAGES.items()}
+_STRUCTS = {msgid: struct.Struct(spec[2]) for msgid, spec in MESSAGES.items()}
+
+def _crc_table():
+    table = []
+    for byte in range(256):
+        tmp = byte
+        tmp ^= (tmp << 4) & 0xFF
+        table.append(((tmp << 8) ^ (tmp << 3) ^ (tmp >> 4)) & 0xFFFF)
+    return table
+
+_CRC_TABLE = _crc_table()
+
+def x25_crc(data, crc=0xFFFF):
+    """CRC-16/MCRF4XX as used by MAVLink."""
+    for byte in data:
+        crc = (crc >> 8) ^ _CRC_TABLE[(crc ^ byte) & 0xFF]
+    return crc
+
+class Message:
+    """A decoded message: ``name``, the sender's ``system``/``component`` and its fields by item access."""
+
+    def __init__(self, name, fields, system=0, component=0):
+        self.name = name
+        self.fields = fields
+        self.system = system
+        self.component = component
+
+    def __getitem__(self, key):
+        return self.fields[key]
+
+    def __repr__(self):
+        return f"Message({self.name!r}, {self.fields!r}, system={self.system}, component={self.component})"
+
+def encode(name, fields, seq=0, system=GCS_SYSTEM_ID, component=GCS_COMPONENT_ID):
+    """Return a MAVLink 2 frame for message ``name``; missing fields are zero."""
+    msgid = MESSAGE_IDS[name]
+    _, crc_extra, _, names = MESSAGES[msgid]
+    payload = _STRUCTS[msgid].pack(*(fields.get(field, 0) for field in names))
+    payload = payload.rstrip(b'\0') or b'\0'  # MAVLink 2 truncates trailing zero bytes
+    header = struct.pack('<BBBBBBBHB', STX_V2, len(payload), 0, 0, seq & 0xFF, system, component,
+                         msgid & 0xFFFF, msgid >> 16)
+    crc = x25_crc(header[1:] + payload)
+    crc = x25_crc(bytes((crc_extra,)), crc)
+    return header + payload + struct.pack('<H', crc)
+
+def _decode_payload(msgid, payload):
+    name, _, _, names = MESSAGES[msgid]
+    layout = _STRUCTS[msgid]
+    # Newer senders may append extension fields we do not know; older ones may omit ours
+    payload = payload[:layout.size].ljust(layout.size, b'\0')
+    return name, dict(zip(names, layout.unpack(payload)))
+
+class FrameParser:
+    """Incremental parser: ``feed(data)`` returns the complete, valid, known messages found so far."""
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def feed(self, data):
+        buf = self._buffer
+        buf.extend(data)
+        messages = []
+        while True:
+            start = next((i for i, b in enumerate(buf) if b in (STX_V1, STX_V2)), None)
+            if start is None:
+                buf.clear()
+                return messages
+            del buf[:start]
+            if len(buf) < 2:
+                return messages
+            if buf[0] == STX_V2:
+                if len(buf) < 10:
+                    return messages
+                length = 10 + buf[1] + 2 + (SIGNATURE_LEN if buf[2] & INCOMPAT_SIGNED else 0)
+                if len(buf) < length:
+                    return messages
+                system, component = buf[5], buf[6]
+                msgid = buf[7] | buf[8] << 8 | buf[9] << 16
+                payload_start = 10
+            else:
+                length = 6 + buf[1] + 2
+                if len(buf) < length:
+                    return messages
+                system, component, msgid = buf[3], buf[4], buf[5]
+                payload_start = 6
+            crc_end = payload_start + buf[1]
+            frame = bytes(buf[:length])
+            spec = MESSAGES.get(msgid)
+            if spec is not None:
+                crc = x25_crc(bytes((spec[1],)), x25_crc(frame[1:crc_end]))
+                if crc == struct.unpack_from('<H', frame, crc_end)[0]:
+                    name, fields = _decode_payload(msgid, frame[payload_start:crc_end])
+                    messages.append(Message(name, fields, system, component))
+                    del buf[:length]
+                    continue
+            # Unknown message or bad checksum: skip this start byte and resynchronize
+            del buf[:1]
+
+class UdpLink:
+    """Datagram link. Listening links reply to whichever address last sent to them."""
+
+    def __init__(self, host, port, listen):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        if listen:
+            self.sock.bind((host, port))
+            self.peer = None
+        else:
+            self.peer = (host, port)
+
+    def send(self, data):
+        if self.peer is not None:
+            self.sock.sendto(data, self.peer)
+
+    def recv(self, timeout):
+        self.sock.settimeout(max(timeout, 0.0))
+        try:
+            data, address = self.sock.recvfrom(65535)
+        except (socket.timeout, BlockingIOError, ConnectionRefusedError):
+            # Refused: an earlier datagram found nobody listening yet
+            return b''
+        self.peer = address
+        return data
+
+    def close(self):
+        self.sock.close()
+
+class SerialLink:
+    """Serial port link (telemetry radio or USB); needs pyserial."""
+
+    def __init__(self, device, baud=DEFAULT_BAUD):
+        try:
+            import serial
+        except ImportError:
+            raise ImportError("Serial connections need pyserial: pip install pyserial") from None
+        self.port = serial.Serial(device, baud, timeout=0)
+
+    def send(self, data):
+        self.port.write(data)
+
+    def recv(self, timeout):
+        self.port.timeout = max(timeout, 0.0)
+        first = self.port.read(1)
+        return first + self.port.read(self.port.in_waiting) if first else b''
+
+    def close(self):
+        self.port.close()
+
+def open_link(connection, baud=DEFAULT_BAUD):
+    """Open a UdpLink or SerialLink from a connection string (see the module docstring)."""
+    kind, _, rest = connection.partition(':')
+    if kind in ('udpin', 'udpout', 'udp'):
+        host, _, port = rest.rpartition(':')
+        if not port.isdigit():
+            raise ValueError(f"Expected {kind}:HOST:PORT, got {connection!r}")
+        return UdpLink(host or '0.0.0.0', int(port), listen=kind != 'udpout')
+    device, _, rate = connection.rpartition(':')
+    if not rate.isdigit():
+        device, rate = connection, baud
+    return SerialLink(device, int(rate))
+
+class MavlinkConnection:
+    """A link plus frame parsing, outgoing sequence numbers and message filtering."""
+
+    def __init__(self, link, system=GCS_SYSTEM_ID, component=GCS_COMPONENT_ID):
+        self.link = link
+        self.system = system
+        self.component = component
+        self._parser = FrameParser()
+        self._pending = []
+        self._seq = 0
+
+    def send(self, name, **fields):
+        self.link.send(encode(name, fields, self._seq, self.system, self.component))
+        self._seq = (self._seq + 1) & 0xFF
+
+    def recv_match(self, names, timeout, system=None):
+        """Return the next message named in ``names`` (from ``system`` if given), or None after ``timeout`` seconds."""
+        deadline = time.monotonic() + timeout
+        while True:
+            while self._pending:
+                message = self._pending.pop(0)
+                if message.name in names and (system is None or message.system == system):
+                    return message
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            self._pending = self._parser.feed(self.link.recv(remaining))
+
+    def wait_heartbeat(self, timeout):
+        """Return the first non-GCS HEARTBEAT, announcing ourselves each second so the vehicle learns our address."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            self.send('HEARTBEAT', type=MAV_TYPE_GCS, autopilot=MAV_AUTOPILOT_INVALID, mavlink_version=3)
+            message = self.recv_match(('HEARTBEAT',), min(1.0, deadline - time.monotonic()))
+            if message is not None and message['type'] != MAV_TYPE_GCS:
+                return message
+        return None
+
+    def close(self):
+        self.link.close()
@@ -0,0 +1,208 @@
+"""Headless mission core: calibration loading, PWM interpolation and QGC WPL 110 generation.
+
+Nothing in here may import tkinter, ttkbootstrap, matplotlib or PIL so that the
+batch CLI and its worker processes can use it without a display.
+"""
+import itertools
+import os
+import numpy as np
+from calibration import Calibration, as_calibration
+from geodesy import leg_distances
+from ingest import DEFAULT_CHUNK_ROWS, RejectReport, home_position, iter_field_chunks, parse_points
+from profiling import StageProfile
+from routing import DEFAULT_TIME_BUDGET, optimize_route
+
+def interpolate_pwm(grams, time_seconds, cal_points):
+    """Interpolate PWM value based on required dispense rate and calibration points.
+
+    ``cal_points`` may be a Calibration or a {pwm: rate} dict. For whole fields
+    use ``Calibration.assign_pwms`` instead of calling this per row.
+    """
+    target_rate = grams / time_seconds if time_seconds > 0 else grams
+    return float(as_calibration(cal_points).pwm_for_rates(target_rate))
+
+def load_calibration_csv(cal_csv):
+    """Load calibration data from CSV with Valve and Avg quantity(g) columns.
+
+    Returns a Calibration. Raises ValueError if the required columns are missing
+    or the curve is not monotonic; read errors propagate.
+    """
+    return Calibration.from_csv(cal_csv)
+
+def leg_times(distances, speed):
+    """Return per-point flight times: 1 s for the first point, then distance/speed."""
+    times = np.ones(len(distances) + 1)
+    if speed > 0:
+        times[1:] = np.asarray(distances) / speed
+    return times
+
+def home_item(lat, lon, altitude):
+    """Return the home MAV_CMD_NAV_WAYPOINT (16) item, without its leading seq field."""
+    return f"\t1\t0\t16\t0.00000000\t0.00000000\t0.00000000\t0.00000000\t{lat:.7f}\t{lon:.7f}\t{altitude:.6f}\t1"
+
+def takeoff_item(altitude):
+    """Return a MAV_CMD_NAV_TAKEOFF (22) item, without its leading seq field."""
+    return f"\t0\t3\t22\t20.00000000\t0.00000000\t0.00000000\t0.00000000\t0.00000000\t0.00000000\t{altitude:.6f}\t1"
+
+def waypoint_item(lat, lon, altitude):
+    """Return a MAV_CMD_NAV_WAYPOINT (16) item, without its leading seq field."""
+    return f"\t0\t3\t16\t0.00000000\t0.00000000\t0.00000000\t0.00000000\t{lat:.7f}\t{lon:.7f}\t{altitude:.6f}\t1"
+
+def servo_item(channel, pwm, param3):
+    """Return a MAV_CMD_DO_SET_SERVO (183) item, without its leading seq field."""
+    return f"\t0\t3\t183\t{channel:.8f}\t{pwm:.8f}\t{param3:.8f}\t0.00000000\t0.00000000\t0.00000000\t0.000000\t1"
+
+def mission_prologue(home, altitude, valve_servo_channel, disc_servo_channel, disc_pwm, include_takeoff):
+    """Return the items flown before the first grid point: home, takeoff and servo init."""
+    # Add home position (MAV_CMD_NAV_WAYPOINT, 16) at mission start
+    items = [home_item(home[0], home[1], altitude)]
+    if include_takeoff:
+        # Add takeoff command (MAV_CMD_NAV_TAKEOFF, 22)
+        items.append(takeoff_item(altitude))
+    # Initialize both servos to 1000 PWM before first waypoint
+    items.append(servo_item(disc_servo_channel, 1000, 0))
+    items.append(servo_item(valve_servo_channel, 1000, 1))
+    # Set disc speed PWM to user-specified value
+    disc_pwm = max(1000, min(2000, int(disc_pwm)))  # Clamp to 1000-2000us
+    items.append(servo_item(disc_servo_channel, disc_pwm, 0))
+    return items
+
+def mission_epilogue(valve_servo_channel, disc_servo_channel):
+    """Return the items flown after the last grid point: set both servos back to 1000 PWM."""
+    return [servo_item(valve_servo_channel, 1000, 1), servo_item(disc_servo_channel, 1000, 0)]
+
+def number_items(items):
+    """Yield the QGC WPL 110 header followed by each item prefixed with its seq number."""
+    yield "QGC WPL 110"
+    for seq, item in enumerate(items):
+        yield f"{seq}{item}"
+
+def format_mission_lines(home, point_chunks, altitude, valve_servo_channel, disc_servo_channel, disc_pwm, include_takeoff):
+    """Yield QGC WPL 110 lines for a home (lat, lon) and an iterable of (lats, lons, pwms) chunks."""
+    def items():
+        yield from mission_prologue(home, altitude, valve_servo_channel, disc_servo_channel, disc_pwm, include_takeoff)
+        for lats, lons, pwms in point_chunks:
+            for lat, lon, pwm in zip(lats, lons, pwms):
+                yield waypoint_item(lat, lon, altitude)
+                yield servo_item(valve_servo_channel, pwm, 1)
+        yield from mission_epilogue(valve_servo_channel, disc_servo_channel)
+    return number_items(items())
+
+def _iter_point_chunks(chunks, speed, calibration, distance_mode, pwm_resolution, field_format, rejects, profile):
+    """Yield (lats, lons, pwms) per CSV chunk, carrying the last point across chunk boundaries."""
+    previous = None  # Last emitted point of the previous chunk
+    for df in chunks:
+        with profile.stage('parse'):
+            lats, lons, grams = parse_points(df, field_format, rejects)
+        if not lats.size:
+            continue
+        with profile.stage('distances'):
+            if previous is None:
+                times = leg_times(leg_distances(lats, lons, distance_mode), speed)
+            else:
+                times = leg_times(leg_distances(np.insert(lats, 0, previous[0]), np.insert(lons, 0, previous[1]), distance_mode), speed)[1:]
+        with profile.stage('pwms'):
+            pwms = calibration.assign_pwms(grams, times, pwm_resolution)
+        yield lats.tolist(), lons.tolist(), pwms
+        previous = (lats[-1], lons[-1])
+
+def point_pwms(lats, lons, grams, speed, calibration, distance_mode='ellipsoidal', pwm_resolution=None, profile=None):
+    """Return valve PWMs for points flown in the given order, the first one with a 1 s leg."""
+    profile = profile if profile is not None else StageProfile()
+    with profile.stage('distances'):
+        times = leg_times(leg_distances(lats, lons, distance_mode), speed)
+    with profile.stage('pwms'):
+        return as_calibration(calibration).assign_pwms(grams, times, pwm_resolution)
+
+def _routed_point_chunks(chunks, speed, calibration, distance_mode, pwm_resolution, field_format, rejects, route_mode, route_budget, route_stats, profile):
+    """Yield one (lats, lons, pwms) chunk holding every parsed point in optimized visit order."""
+    parsed = []
+    for df in chunks:
+        with profile.stage('parse'):
+            parsed.append(parse_points(df, field_format, rejects))
+    if not parsed:
+        return
+    lats, lons, grams = (np.concatenate(column) for column in zip(*parsed))
+    if not lats.size:
+        return
+    with profile.stage('route'):
+        order = optimize_route(lats, lons, route_mode, route_budget, route_stats)
+        lats, lons, grams = lats[order], lons[order], grams[order]
+    yield lats.tolist(), lons.tolist(), point_pwms(lats, lons, grams, speed, calibration, distance_mode, pwm_resolution, profile)
+
+def iter_mission_lines(input_csv, altitude, speed, cal_points, valve_servo_channel, disc_servo_channel, disc_pwm, include_takeoff, distance_mode='ellipsoidal', pwm_resolution=None, chunksize=DEFAULT_CHUNK_ROWS, route_mode='csv', route_budget=DEFAULT_TIME_BUDGET, route_stats=None, field_format=None, rejects=None, profile=None):
+    """Yield QGC WPL 110 lines one at a time, reading the CSV in chunks.
+
+    Only one chunk of rows is held in memory; the last point of each chunk is
+    carried over so leg distances and ``seq`` numbering continue across chunks.
+    The lines are exactly those returned by ``generate_waypoints``.
+    Any ``route_mode`` other than ``'csv'`` (see ``routing.ROUTE_MODES``) needs
+    every point at once, so the parsed points are then held in memory and
+    ``route_stats`` (a RouteStats) receives the path lengths.
+    ``field_format`` (an ``ingest.FieldFormat``) sets the CSV columns and
+    separators. Rejected rows are recorded in ``rejects`` (a RejectReport);
+    without one, a summary is printed once the lines are exhausted.
+    ``profile`` (a ``profiling.StageProfile``) receives per-stage timings;
+    pass the same one to ``write_mission`` to split formatting from writing.
+    Read errors on ``input_csv`` propagate to the caller when iterated.
+    """
+    calibration = as_calibration(cal_points)
+    report = rejects if rejects is not None else RejectReport()
+    profile = profile if profile is not None else StageProfile()
+    chunks = profile.iterate('read', iter_field_chunks(input_csv, chunksize, field_format))
+    first_chunk = next(chunks, None)  # None when the reader yields no chunks at all (pyarrow on an empty file)
+    if first_chunk is not None:
+        chunks = itertools.chain([first_chunk], chunks)
+    if route_mode == 'csv':
+        point_chunks = _iter_point_chunks(chunks, speed, calibration, distance_mode, pwm_resolution, field_format, report, profile)
+    else:
+        point_chunks = _routed_point_chunks(chunks, speed, calibration, distance_mode, pwm_resolution, field_format, report,
+                                            route_mode, route_budget, route_stats, profile)
+    home = home_position(first_chunk, field_format) if first_chunk is not None else (0.0, 0.0)
+    yield from format_mission_lines(home, point_chunks, altitude, valve_servo_channel,
+                                    disc_servo_channel, disc_pwm, include_takeoff)
+    if rejects is None and len(report):
+        print(f"{input_csv}: {report}")
+
+def generate_waypoints(input_csv, altitude, speed, cal_points, valve_servo_channel, disc_servo_channel, disc_pwm, include_takeoff, distance_mode='ellipsoidal', pwm_resolution=None, route_mode='csv', field_format=None, rejects=None):
+    """Generate QGC WPL 110 waypoint lines from CSV input.
+
+    ``cal_points`` is a Calibration (or a {pwm: rate} dict). Leg lengths are
+    computed in one batch by ``geodesy.leg_distances``; pass
+    ``distance_mode='fast'`` for the tangent-plane approximation and
+    ``pwm_resolution`` to use the calibration's quantized lookup table, and
+    ``route_mode='nearest'`` or ``'boustrophedon'`` to reorder the points.
+    ``field_format`` and ``rejects`` are as for ``iter_mission_lines``.
+    Read errors on ``input_csv`` propagate to the caller. For large fields
+    prefer ``write_mission(iter_mission_lines(...), path)``, which streams.
+    """
+    return list(iter_mission_lines(input_csv, altitude, speed, cal_points, valve_servo_channel, disc_servo_channel, disc_pwm, include_takeoff, distance_mode, pwm_resolution, route_mode=route_mode,
+                                   field_format=field_format, rejects=rejects))
+
+def write_mission(lines, output_path, batch_lines=4096, profile=None):
+    """Stream mission lines to ``output_path``, newline-separated with no trailing newline.
+
+    Output matches ``'\\n'.join(lines)`` byte for byte. Lines are written in
+    batches to a temporary file that replaces ``output_path`` only on success,
+    so a failure part-way never leaves a truncated mission. Returns the line count.
+    With a ``profile``, pulling each batch from ``lines`` is timed as ``format``
+    and writing it as ``write``.
+    """
+    lines = iter(lines)
+    profile = profile if profile is not None else StageProfile()
+    tmp_path = output_path + '.tmp'
+    count = 0
+    try:
+        with open(tmp_path, 'w') as outfile:
+            for batch in profile.iterate('format', iter(lambda: list(itertools.islice(lines, batch_lines)), [])):
+                with profile.stage('write'):
+                    if count:
+                        outfile.write('\n')
+                    outfile.write('\n'.join(batch))
+                count += len(batch)
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return count
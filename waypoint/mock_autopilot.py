@@ -0,0 +1,190 @@
+"""Local stand-in autopilot for testing mission uploads offline.
+
+Usage example::
+
+    python mock_autopilot.py --port 14550 --loss 0.05
+    python upload.py field.waypoints --connect udpout:127.0.0.1:14550
+
+``MockAutopilot`` answers the MAVLink mission protocol over UDP like a vehicle
+would. It sends heartbeats, takes uploads (MISSION_COUNT, requests, ACK) and
+serves downloads of the stored mission. ``loss`` drops that fraction of
+datagrams in each direction, so the uploader's retransmission can be exercised.
+
+Items that arrive ahead of the one requested are buffered. Each batch of
+datagrams is handled before the next request goes out, and that request is
+for the lowest missing item. A sender that pipelines therefore gets roughly
+one request per window, and a lost item is asked for again as soon as later
+ones arrive. An unanswered request is repeated after ``request_timeout``
+seconds.
+
+Items are stored the way ArduCopter stores them, which is not the way they
+were sent. NAV commands keep their frame and location, plus the hold time of
+a waypoint and the pitch of a takeoff, both in whole units. DO_SET_SERVO keeps
+only its channel and PWM. Every other field reads back as zero (frame 0), and
+``autocontinue`` as 1.
+"""
+import argparse
+import random
+import socket
+import threading
+import time
+from mavlink import FrameParser, encode
+
+MAV_TYPE_QUADROTOR = 2
+MAV_AUTOPILOT_ARDUPILOTMEGA = 3
+MAV_STATE_STANDBY = 3
+HEARTBEAT_INTERVAL = 1.0
+DEFAULT_REQUEST_TIMEOUT = 0.2
+MAV_CMD_NAV_LAST = 95           # Commands below this are NAV commands with a location
+MAV_CMD_NAV_WAYPOINT = 16
+MAV_CMD_NAV_TAKEOFF = 22
+MAV_CMD_DO_SET_SERVO = 183
+
+def stored_item(item):
+    """Return the MISSION_ITEM_INT fields ArduCopter reads back for an uploaded ``item``."""
+    command = item['command']
+    stored = dict(item, current=0, autocontinue=1)
+    if command < MAV_CMD_NAV_LAST:
+        stored.update(param1=0.0, param2=0.0, param3=0.0, param4=0.0)
+        if command in (MAV_CMD_NAV_WAYPOINT, MAV_CMD_NAV_TAKEOFF):
+            stored['param1'] = float(int(item['param1']))
+    else:
+        stored.update(frame=0, x=0, y=0, z=0.0)
+        if command == MAV_CMD_DO_SET_SERVO:
+            stored.update(param1=float(int(item['param1'])), param2=float(int(item['param2'])), param3=0.0, param4=0.0)
+    return stored
+
+class MockAutopilot:
+    """UDP mission-protocol responder running on a background thread; use as a context manager."""
+
+    def __init__(self, host='127.0.0.1', port=0, loss=0.0, seed=None, system=1, component=1, request_timeout=DEFAULT_REQUEST_TIMEOUT):
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        self.address = self.sock.getsockname()
+        self.loss = loss
+        self.system = system
+        self.component = component
+        self.request_timeout = request_timeout
+        self.items = []          # Stored mission: MISSION_ITEM_INT field dicts, see stored_item
+        self.uploads = 0         # Completed uploads
+        self.received = 0        # Item datagrams received, duplicates included
+        self._random = random.Random(seed)
+        self._parser = FrameParser()
+        self._peer = None
+        self._peer_system, self._peer_component = 255, 0
+        self._seq = 0
+        self._incoming = None    # Items of the upload in progress, None when idle
+        self._lowest = 0         # Lowest missing item of the upload in progress
+        self._requested = None   # Item last requested, and when
+        self._requested_at = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.sock.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _send(self, name, **fields):
+        if self._peer is None or self._random.random() < self.loss:
+            return
+        self.sock.sendto(encode(name, fields, self._seq, self.system, self.component), self._peer)
+        self._seq = (self._seq + 1) & 0xFF
+
+    def _receive_batch(self, timeout):
+        """Return every datagram that arrives within ``timeout``, plus any already queued behind it."""
+        batch = []
+        self.sock.settimeout(timeout)
+        try:
+            while True:
+                data, address = self.sock.recvfrom(65535)
+                self._peer = address
+                if self._random.random() >= self.loss:
+                    batch.append(data)
+                self.sock.settimeout(0)
+        except (socket.timeout, BlockingIOError, ConnectionRefusedError):
+            return batch
+
+    def _request_next(self, overtaken):
+        """Ask for the lowest missing item if it changed, was overtaken or its request went unanswered; ACK once complete."""
+        while self._lowest < len(self._incoming) and self._incoming[self._lowest] is not None:
+            self._lowest += 1
+        if self._lowest == len(self._incoming):
+            self.items, self._incoming = self._incoming, None
+            self.uploads += 1
+            self._send('MISSION_ACK', target_system=self._peer_system, target_component=self._peer_component, type=0)
+        elif (self._lowest != self._requested or overtaken
+              or time.monotonic() - self._requested_at > self.request_timeout):
+            self._send('MISSION_REQUEST_INT', seq=self._lowest, target_system=self._peer_system,
+                       target_component=self._peer_component)
+            self._requested, self._requested_at = self._lowest, time.monotonic()
+
+    def _handle(self, message):
+        """Handle one message; returns True for a new item beyond the one last requested."""
+        self._peer_system, self._peer_component = message.system, message.component
+        if message.name == 'MISSION_COUNT':
+            self._incoming, self._lowest, self._requested = [None] * message['count'], 0, None
+        elif message.name == 'MISSION_ITEM_INT':
+            self.received += 1
+            seq = message['seq']
+            if self._incoming is None:
+                # Upload already complete: the sender missed our ACK
+                self._send('MISSION_ACK', target_system=message.system, target_component=message.component, type=0)
+            elif seq < len(self._incoming) and self._incoming[seq] is None:
+                self._incoming[seq] = stored_item(message.fields)
+                return self._requested is not None and seq > self._requested
+        elif message.name == 'MISSION_REQUEST_LIST':
+            self._send('MISSION_COUNT', count=len(self.items), target_system=message.system,
+                       target_component=message.component)
+        elif message.name in ('MISSION_REQUEST_INT', 'MISSION_REQUEST'):
+            if message['seq'] < len(self.items):
+                self._send('MISSION_ITEM_INT', **dict(self.items[message['seq']], target_system=message.system,
+                                                      target_component=message.component))
+        return False
+
+    def _serve(self):
+        next_heartbeat = 0.0
+        while not self._stop.is_set():
+            now = time.monotonic()
+            if now >= next_heartbeat:
+                self._send('HEARTBEAT', type=MAV_TYPE_QUADROTOR, autopilot=MAV_AUTOPILOT_ARDUPILOTMEGA,
+                           system_status=MAV_STATE_STANDBY, mavlink_version=3)
+                next_heartbeat = now + HEARTBEAT_INTERVAL
+            overtaken = False
+            for data in self._receive_batch(min(self.request_timeout, 0.05)):
+                for message in self._parser.feed(data):
+                    overtaken = self._handle(message) or overtaken
+            if self._incoming is not None:
+                self._request_next(overtaken)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Answer MAVLink mission uploads on a UDP port, like a vehicle would.")
+    parser.add_argument('--host', default='127.0.0.1', help="Address to listen on (default: 127.0.0.1)")
+    parser.add_argument('--port', type=int, default=14550, help="UDP port (default: 14550)")
+    parser.add_argument('--loss', type=float, default=0.0, help="Fraction of datagrams dropped each way (default: 0)")
+    parser.add_argument('--seed', type=int, default=None, help="Random seed for --loss")
+    args = parser.parse_args(argv)
+    with MockAutopilot(args.host, args.port, args.loss, args.seed) as vehicle:
+        print(f"Mock autopilot listening on {vehicle.address[0]}:{vehicle.address[1]} (Ctrl+C to stop)")
+        uploads = 0
+        try:
+            while True:
+                time.sleep(0.5)
+                if vehicle.uploads != uploads:
+                    uploads = vehicle.uploads
+                    print(f"Upload {uploads}: {len(vehicle.items)} items stored ({vehicle.received} item datagrams received)")
+        except KeyboardInterrupt:
+            pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,259 @@
+"""Mission plan: the computed coordinates, legs, times and PWMs for one field.
+
+Visualization, image export and waypoint generation all start from a
+``MissionPlan`` obtained through ``get_plan``, which keeps recently built plans
+in a small LRU cache keyed by the input file's content hash, the calibration
+fingerprint and the mission parameters.
+
+On a cache miss the plan is rebuilt by the field's ``IncrementalPlanner``,
+which splits planning into explicit stages and only recomputes the stages
+whose inputs changed::
+
+    parse ──> route ──> distances ──> times ──> pwms ──> servo items
+             (route_mode,  (distance_mode) (speed)  (calibration,   (valve channel)
+              budget)                               pwm_resolution)
+                │
+                └──> waypoint items (altitude)
+
+The parse stage is keyed by the file's content hash and its ``FieldFormat``.
+The route stage is skipped (points stay in CSV order) when ``route_mode`` is 'csv'.
+
+The prologue/epilogue items (home, takeoff, servo init/shutdown) are a handful
+of lines and are always reformatted; ``seq`` numbers are added on output.
+"""
+import hashlib
+import itertools
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+from calibration import as_calibration
+from geodesy import leg_distances
+from ingest import RejectReport, home_position, iter_field_chunks, parse_points
+from mission import leg_times, mission_epilogue, mission_prologue, number_items, servo_item, waypoint_item
+from routing import DEFAULT_TIME_BUDGET, RouteStats, optimize_route
+
+PLAN_CACHE_SIZE = 8
+PLANNER_CACHE_SIZE = 4
+FORMAT_CHUNK_ITEMS = 50_000
+
+_plan_cache = OrderedDict()
+_planners = OrderedDict()
+_cache_lock = threading.RLock()
+
+class PlanCancelled(Exception):
+    """Raised from a progress callback to abort planning; no partial stage is cached."""
+
+def _report(progress, stage, done, total):
+    if progress is not None:
+        progress(stage, done, total)
+
+def count_data_rows(path):
+    """Return the number of lines after the header, as a cheap total for progress reporting."""
+    with open(path, 'rb') as infile:
+        lines = sum(block.count(b'\n') for block in iter(lambda: infile.read(1 << 20), b''))
+    return max(lines - 1, 0)
+
+def _format_items(stage, values, format_one, progress):
+    """Format ``values`` into item strings in chunks, reporting progress between chunks."""
+    items = []
+    for start in range(0, len(values), FORMAT_CHUNK_ITEMS):
+        items.extend(format_one(*v) for v in values[start:start + FORMAT_CHUNK_ITEMS])
+        _report(progress, stage, len(items), len(values))
+    return items
+
+class MissionPlan:
+    """Parsed field points plus everything derived from them for one set of parameters."""
+
+    def __init__(self, home, lats, lons, grams, distances, times, pwms, prologue, epilogue, items_factory, route_stats=None, rejects=None):
+        self.home = home
+        self.lats = lats
+        self.lons = lons
+        self.grams = grams
+        self.distances = distances
+        self.times = times
+        self.pwms = pwms  # None when planned without a calibration
+        self.route_stats = route_stats  # RouteStats, or None when flown in CSV order
+        self.rejects = rejects  # RejectReport of the rows left out while parsing
+        self.prologue = prologue
+        self.epilogue = epilogue
+        self._items_factory = items_factory
+        self._items = None
+
+    def __len__(self):
+        return self.lats.size
+
+    def point_items(self, progress=None):
+        """Return (waypoint_items, servo_items) for the grid points, formatting them on first use."""
+        if self.pwms is None:
+            raise ValueError("Mission plan has no calibration; PWMs are unavailable")
+        if self._items is None:
+            with _cache_lock:
+                self._items = self._items_factory(progress)
+        return self._items
+
+    def item_count(self):
+        """Return the number of mission items (lines after the header)."""
+        return len(self.prologue) + 2 * len(self) + len(self.epilogue)
+
+    def item_at(self, k):
+        """Return mission item ``k`` (0-based, without seq) without materializing the whole mission."""
+        if k < len(self.prologue):
+            return self.prologue[k]
+        k -= len(self.prologue)
+        if k < 2 * len(self):
+            waypoint_items, servo_items = self.point_items()
+            return (servo_items if k % 2 else waypoint_items)[k // 2]
+        return self.epilogue[k - 2 * len(self)]
+
+    def iter_items(self, progress=None):
+        """Yield every mission item in flight order, without seq numbers."""
+        waypoint_items, servo_items = self.point_items(progress)
+        yield from self.prologue
+        yield from itertools.chain.from_iterable(zip(waypoint_items, servo_items))
+        yield from self.epilogue
+
+    def iter_lines(self, progress=None):
+        """Yield the QGC WPL 110 lines for this plan; needs a calibration."""
+        self.point_items(progress)  # Fail before yielding the header if there are no PWMs
+        return number_items(self.iter_items())
+
+class IncrementalPlanner:
+    """Plans one input file, reusing every stage whose inputs have not changed.
+
+    Each stage is cached under a key built from its own parameters and its
+    upstream stage's key, so e.g. a new ``speed`` invalidates times, PWMs and
+    servo items but keeps the parsed points, distances and waypoint items.
+    ``recomputed`` lists the stages rebuilt by the most recent work.
+
+    ``progress(stage, done, total)`` callbacks are invoked per CSV chunk while
+    parsing, per chunk of formatted items and after each other stage; raise
+    PlanCancelled from the callback to stop.
+    """
+
+    def __init__(self, input_csv):
+        self.input_csv = input_csv
+        self._stages = {}
+        self.recomputed = []
+
+    def _stage(self, name, key, compute):
+        cached = self._stages.get(name)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        value = compute()
+        self._stages[name] = (key, value)
+        self.recomputed.append(name)
+        return value
+
+    def _parse(self, field_format, progress):
+        total = count_data_rows(self.input_csv)
+        home, parsed, done = None, [], 0
+        rejects = RejectReport()
+        for df in iter_field_chunks(self.input_csv, field_format=field_format):
+            if home is None:
+                home = home_position(df, field_format)
+            parsed.append(parse_points(df, field_format, rejects))
+            done += len(df)
+            _report(progress, 'parse', done, total)
+        if not parsed:
+            return (0.0, 0.0), np.empty(0), np.empty(0), np.empty(0), rejects
+        lats, lons, grams = (np.concatenate(column) for column in zip(*parsed))
+        return home, lats, lons, grams, rejects
+
+    def _route(self, lats, lons, grams, route_mode, route_budget):
+        stats = RouteStats()
+        order = optimize_route(lats, lons, route_mode, route_budget, stats)
+        return lats[order], lons[order], grams[order], stats
+
+    def plan(self, altitude, speed, cal_points, valve_servo_channel, disc_servo_channel, disc_pwm, include_takeoff, distance_mode='ellipsoidal', pwm_resolution=None, digest=None, progress=None, route_mode='csv', route_budget=DEFAULT_TIME_BUDGET, field_format=None):
+        """Return a MissionPlan for these parameters. ``digest`` is the file's content hash if already known."""
+        self.recomputed = []
+        calibration = as_calibration(cal_points) if cal_points is not None else None
+        parse_key = (digest or file_digest(self.input_csv), field_format)
+        home, lats, lons, grams, rejects = self._stage('parse', parse_key, lambda: self._parse(field_format, progress))
+        n = lats.size
+        route_key, route_stats = parse_key, None
+        if route_mode != 'csv':
+            route_key = (parse_key, route_mode, route_budget)
+            lats, lons, grams, route_stats = self._stage('route', route_key, lambda: self._route(lats, lons, grams, route_mode, route_budget))
+            _report(progress, 'route', n, n)
+        distances_key = (route_key, distance_mode)
+        distances = self._stage('distances', distances_key, lambda: leg_distances(lats, lons, distance_mode))
+        _report(progress, 'distances', n, n)
+        times_key = (distances_key, speed)
+        times = self._stage('times', times_key, lambda: leg_times(distances, speed))
+        pwms = None
+        pwms_key = None
+        if calibration is not None:
+            pwms_key = (times_key, calibration.fingerprint(), pwm_resolution)
+            pwms = self._stage('pwms', pwms_key, lambda: calibration.assign_pwms(grams, times, pwm_resolution))
+            _report(progress, 'pwms', n, n)
+
+        def items_factory(progress=None):
+            waypoint_items = self._stage('waypoint items', (route_key, altitude), lambda: _format_items(
+                'waypoint items', list(zip(lats.tolist(), lons.tolist())), lambda lat, lon: waypoint_item(lat, lon, altitude), progress))
+            servo_items = self._stage('servo items', (pwms_key, valve_servo_channel), lambda: _format_items(
+                'servo items', [(pwm,) for pwm in pwms.tolist()], lambda pwm: servo_item(valve_servo_channel, pwm, 1), progress))
+            return waypoint_items, servo_items
+
+        prologue = mission_prologue(home, altitude, valve_servo_channel, disc_servo_channel, disc_pwm, include_takeoff)
+        epilogue = mission_epilogue(valve_servo_channel, disc_servo_channel)
+        return MissionPlan(home, lats, lons, grams, distances, times, pwms, prologue, epilogue, items_factory, route_stats, rejects)
+
+def file_digest(path, block_size=1 << 20):
+    """Return the SHA-256 hex digest of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as infile:
+        for block in iter(lambda: infile.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def build_plan(input_csv, altitude, speed, cal_points, valve_servo_channel, disc_servo_channel, disc_pwm, include_takeoff, distance_mode='ellipsoidal', pwm_resolution=None, route_mode='csv', field_format=None):
+    """Parse ``input_csv`` and compute a MissionPlan without touching any cache.
+
+    ``cal_points`` may be None, in which case the plan carries no PWMs.
+    """
+    return IncrementalPlanner(input_csv).plan(altitude, speed, cal_points, valve_servo_channel, disc_servo_channel,
+                                              disc_pwm, include_takeoff, distance_mode, pwm_resolution, route_mode=route_mode,
+                                              field_format=field_format)
+
+def get_planner(input_csv):
+    """Return the IncrementalPlanner kept for ``input_csv`` (most recently used files only)."""
+    path = os.path.abspath(input_csv)
+    with _cache_lock:
+        planner = _planners.get(path)
+        if planner is None:
+            planner = _planners[path] = IncrementalPlanner(path)
+            while len(_planners) > PLANNER_CACHE_SIZE:
+                _planners.popitem(last=False)
+        _planners.move_to_end(path)
+    return planner
+
+def get_plan(input_csv, altitude, speed, cal_points, valve_servo_channel, disc_servo_channel, disc_pwm, include_takeoff, distance_mode='ellipsoidal', pwm_resolution=None, progress=None, route_mode='csv', route_budget=DEFAULT_TIME_BUDGET, field_format=None):
+    """Return a cached MissionPlan, re-planning incrementally if this parameter set is new.
+
+    Safe to call from a worker thread; ``progress`` is passed to the planner.
+    """
+    calibration = as_calibration(cal_points) if cal_points is not None else None
+    digest = file_digest(input_csv)
+    key = (digest, calibration.fingerprint() if calibration is not None else None,
+           altitude, speed, valve_servo_channel, disc_servo_channel, disc_pwm, include_takeoff, distance_mode, pwm_resolution,
+           route_mode, route_budget, field_format)
+    with _cache_lock:
+        plan = _plan_cache.get(key)
+        if plan is not None:
+            _plan_cache.move_to_end(key)
+            return plan
+        plan = get_planner(input_csv).plan(altitude, speed, calibration, valve_servo_channel, disc_servo_channel,
+                                           disc_pwm, include_takeoff, distance_mode, pwm_resolution, digest, progress,
+                                           route_mode, route_budget, field_format)
+        _plan_cache[key] = plan
+        while len(_plan_cache) > PLAN_CACHE_SIZE:
+            _plan_cache.popitem(last=False)
+    return plan
+
+def clear_plan_cache():
+    """Drop all cached plans and planner stages."""
+    with _cache_lock:
+        _plan_cache.clear()
+        _planners.clear()
@@ -0,0 +1,115 @@
+"""Matplotlib rendering of mission plans.
+
+Small fields are drawn as before: one large marker and one label per point.
+Above ``LARGE_FIELD_THRESHOLD`` points the plot switches to a large-field mode
+whose cost does not grow with the number of labels:
+
+* points are a rasterized scatter, so vector exports embed a single image;
+  above ``IMAGE_THRESHOLD`` they are aggregated into one ``IMAGE_BINS`` square
+  image of mean fertilizer quantity, whose draw cost is independent of N;
+* labels are culled to at most one per ``LABEL_CELL_PX`` screen cell and
+  ``MAX_LABELS`` in total, and are only built for points inside the view;
+* labels are rebuilt lazily when the view limits change (pan/zoom).
+"""
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.colors import Normalize
+from matplotlib.cm import ScalarMappable
+
+LARGE_FIELD_THRESHOLD = 1000
+IMAGE_THRESHOLD = 50_000
+IMAGE_BINS = 400
+MAX_LABELS = 250
+LABEL_CELL_PX = (100, 28)
+
+def _label(i, pwms):
+    text = f"{i+1}"
+    if pwms is not None:
+        text += f": {pwms[i]}"
+    return text
+
+def _visible_label_indices(ax, lons, lats):
+    """Return indices of in-view points to label, at most one per screen cell."""
+    (x0, x1), (y0, y1) = sorted(ax.get_xlim()), sorted(ax.get_ylim())
+    visible = np.flatnonzero((lons >= x0) & (lons <= x1) & (lats >= y0) & (lats <= y1))
+    if visible.size == 0:
+        return visible
+    pixels = ax.transData.transform(np.column_stack((lons[visible], lats[visible])))
+    cells = np.floor(pixels / LABEL_CELL_PX).astype(np.int64)
+    cells -= cells.min(axis=0)
+    _, first = np.unique(cells[:, 0] * (cells[:, 1].max() + 1) + cells[:, 1], return_index=True)
+    return visible[np.sort(first)][:MAX_LABELS]
+
+def _attach_lazy_labels(ax, lons, lats, pwms):
+    """Draw culled labels now and rebuild them whenever the view limits change.
+
+    Pan/zoom already schedules a redraw after changing the limits, so the
+    callback only swaps the text artists.
+    """
+    labels = []
+
+    def refresh(_ax=None):
+        for text in labels:
+            text.remove()
+        labels.clear()
+        for i in _visible_label_indices(ax, lons, lats):
+            labels.append(ax.text(lons[i], lats[i], _label(i, pwms), fontsize=8, ha='center', va='bottom', color='darkblue'))
+
+    refresh()
+    ax.callbacks.connect('xlim_changed', refresh)
+    ax.callbacks.connect('ylim_changed', refresh)
+
+def _draw_mean_image(ax, lons, lats, grams, cmap, norm):
+    """Draw mean fertilizer per cell of an IMAGE_BINS grid as a single image; empty cells stay blank."""
+    extent = (lons.min(), lons.max(), lats.min(), lats.max())
+    bins = (IMAGE_BINS, IMAGE_BINS)
+    ranges = (extent[2:], extent[:2])
+    totals, _, _ = np.histogram2d(lats, lons, bins=bins, range=ranges, weights=grams)
+    counts, _, _ = np.histogram2d(lats, lons, bins=bins, range=ranges)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = np.where(counts > 0, totals / counts, np.nan)
+    ax.imshow(means, extent=extent, origin='lower', aspect='auto', interpolation='nearest', cmap=cmap, norm=norm)
+
+def plot_plan(plan, disc_pwm, large=None, fig=None):
+    """Draw a MissionPlan colored by fertilizer quantity and return the figure.
+
+    ``large`` forces the large-field mode on or off; by default it is chosen
+    from the number of points. Pass a ``matplotlib.figure.Figure`` as ``fig``
+    to render off the GUI thread (e.g. for export) instead of through pyplot.
+    """
+    lons, lats, grams = plan.lons, plan.lats, plan.grams
+    pwms = plan.pwms.tolist() if plan.pwms is not None else None
+    if large is None:
+        large = len(plan) > LARGE_FIELD_THRESHOLD
+    if fig is None:
+        fig, ax = plt.subplots(figsize=(10, 8))
+    else:
+        ax = fig.subplots()
+    if len(plan):
+        norm = Normalize(vmin=grams.min(), vmax=grams.max())
+        cmap = plt.get_cmap('RdBu')
+        # Colorbar first, so the axes already have their final size when labels are culled
+        cbar = fig.colorbar(ScalarMappable(norm=norm, cmap=cmap), ax=ax)
+        cbar.set_label('Fertilizer Quantity (g)', fontsize=12)
+        # Set tighter axis limits with padding
+        lon_range = lons.max() - lons.min()
+        lat_range = lats.max() - lats.min()
+        padding = 0.05 * max(lon_range, lat_range)
+        ax.set_xlim(lons.min() - padding, lons.max() + padding)
+        ax.set_ylim(lats.min() - padding, lats.max() + padding)
+        if not large:
+            ax.scatter(lons, lats, c=grams, cmap=cmap, norm=norm, s=100, edgecolors='black', linewidth=0.5)
+            for i, (lon, lat) in enumerate(zip(lons.tolist(), lats.tolist())):
+                ax.text(lon, lat, _label(i, pwms), fontsize=10, ha='center', va='bottom', color='darkblue')
+        elif len(plan) > IMAGE_THRESHOLD:
+            _draw_mean_image(ax, lons, lats, grams, cmap, norm)
+            _attach_lazy_labels(ax, lons, lats, pwms)
+        else:
+            ax.scatter(lons, lats, c=grams, cmap=cmap, norm=norm, s=4, linewidths=0, rasterized=True)
+            _attach_lazy_labels(ax, lons, lats, pwms)
+        ax.text(lons.min(), lats.max(), f"Disc PWM: {disc_pwm}", ha='left', va='top', fontsize=12, color='red')
+    ax.set_title("Fertilizer Waypoints with Quantity Coloring and PWMs", fontsize=16, weight='bold', color='navy')
+    ax.set_xlabel("Longitude", fontsize=12)
+    ax.set_ylabel("Latitude", fontsize=12)
+    ax.grid(True, linestyle='--', alpha=0.7)
+    return fig
@@ -0,0 +1,186 @@
+"""Virtualized waypoint preview/editor for large missions.
+
+The mission is kept in a ``MissionStore``: a read-only base sequence of lines
+(normally ``PlanLines``, which formats lines on demand from a cached
+MissionPlan) plus a dict of per-line edits. ``VirtualPreview`` only ever puts
+the rows that fit in the window into its ``tk.Text``; scrolling re-renders that
+window, and edits are folded back into the store as per-line diffs before the
+window moves. Saving streams base lines plus edits to disk.
+"""
+import difflib
+import tkinter as tk
+import tkinter.font as tkfont
+import ttkbootstrap as ttk
+from mission import write_mission
+
+class PlanLines:
+    """Sequence view of a MissionPlan's QGC WPL 110 lines, formatted on access."""
+
+    def __init__(self, plan):
+        self.plan = plan
+        self._length = plan.item_count() + 1
+
+    def __len__(self):
+        return self._length
+
+    def __getitem__(self, i):
+        if i == 0:
+            return "QGC WPL 110"
+        return f"{i - 1}{self.plan.item_at(i - 1)}"
+
+class MissionStore:
+    """Base mission lines plus per-line edits.
+
+    ``edits`` maps a base line index to the list of lines replacing it: one
+    line for an in-place edit, none for a deletion, several when lines were
+    inserted after it.
+    """
+
+    def __init__(self, base):
+        self.base = base
+        self.edits = {}
+
+    def __len__(self):
+        return len(self.base)
+
+    def lines_for(self, index):
+        return self.edits.get(index, [self.base[index]])
+
+    def window(self, start, stop):
+        """Return (lines, owners) for base indices [start, stop); owners[i] is the base index of lines[i]."""
+        lines, owners = [], []
+        for index in range(start, min(stop, len(self.base))):
+            replacement = self.lines_for(index)
+            lines.extend(replacement)
+            owners.extend([index] * len(replacement))
+        return lines, owners
+
+    def apply_window_edit(self, start, stop, old_lines, owners, new_lines):
+        """Record the edit of a rendered window as per-line diffs against the base."""
+        if old_lines == new_lines:
+            return
+        stop = min(stop, len(self.base))
+        if new_lines == [self.base[index] for index in range(start, stop)]:
+            for index in range(start, stop):
+                self.edits.pop(index, None)
+            return
+        result = {index: [] for index in range(start, stop)}
+        matcher = difflib.SequenceMatcher(None, old_lines, new_lines, autojunk=False)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == 'equal':
+                for k in range(i2 - i1):
+                    result[owners[i1 + k]].append(new_lines[j1 + k])
+            elif j2 > j1:
+                # Replaced or inserted lines belong to the first replaced line,
+                # or to the line they follow (the window's first line if none)
+                if i2 > i1:
+                    owner = owners[i1]
+                elif i1 > 0:
+                    owner = owners[i1 - 1]
+                else:
+                    owner = owners[0] if owners else start
+                result[owner].extend(new_lines[j1:j2])
+        for index, lines in result.items():
+            if lines == [self.base[index]]:
+                self.edits.pop(index, None)
+            else:
+                self.edits[index] = lines
+
+    def iter_lines(self):
+        """Yield the edited mission line by line."""
+        for index in range(len(self.base)):
+            if index in self.edits:
+                yield from self.edits[index]
+            else:
+                yield self.base[index]
+
+    def save(self, output_path):
+        """Stream the edited mission to ``output_path``; returns the line count."""
+        return write_mission(self.iter_lines(), output_path)
+
+class VirtualPreview:
+    """Text widget that renders only the visible rows of a MissionStore."""
+
+    def __init__(self, master, store):
+        self.store = store
+        self.start = 0
+        self.rows = 40
+        self._rendered = ([], [])
+        self._rendered_range = (0, 0)
+        body = ttk.Frame(master)
+        body.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+        self.text = tk.Text(body, wrap='none', font=('Courier', 10), undo=False)
+        self.yscroll = tk.Scrollbar(body, command=self._on_scrollbar)
+        self.yscroll.pack(side=tk.RIGHT, fill=tk.Y)
+        xscroll = tk.Scrollbar(body, orient='horizontal', command=self.text.xview)
+        xscroll.pack(side=tk.BOTTOM, fill=tk.X)
+        self.text.config(xscrollcommand=xscroll.set)
+        self.text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.status = ttk.Label(master, font=('Helvetica', 10))
+        self.status.pack(side=tk.TOP, anchor='w', padx=10)
+        self._linespace = tkfont.Font(font=self.text.cget('font')).metrics('linespace')
+        self.text.bind('<Configure>', self._on_resize)
+        self.text.bind('<MouseWheel>', lambda e: self._scroll_lines(-3 if e.delta > 0 else 3))
+        self.text.bind('<Button-4>', lambda e: self._scroll_lines(-3))
+        self.text.bind('<Button-5>', lambda e: self._scroll_lines(3))
+        self.text.bind('<Prior>', lambda e: self._scroll_lines(-self.rows))
+        self.text.bind('<Next>', lambda e: self._scroll_lines(self.rows))
+        self.text.bind('<Up>', self._on_up)
+        self.text.bind('<Down>', self._on_down)
+        self.render()
+
+    def commit(self):
+        """Fold edits made in the rendered window back into the store."""
+        old_lines, owners = self._rendered
+        new_lines = self.text.get('1.0', 'end-1c').split('\n')
+        start, stop = self._rendered_range
+        self.store.apply_window_edit(start, stop, old_lines, owners, new_lines)
+
+    def render(self):
+        stop = self.start + self.rows
+        lines, owners = self.store.window(self.start, stop)
+        self._rendered = (lines, owners)
+        self._rendered_range = (self.start, stop)
+        self.text.delete('1.0', tk.END)
+        self.text.insert('1.0', '\n'.join(lines))
+        total = max(len(self.store), 1)
+        self.yscroll.set(self.start / total, min(stop, total) / total)
+        self.status.config(text=f"Lines {self.start + 1:,}–{min(stop, total):,} of {len(self.store):,}"
+                                f" ({len(self.store.edits):,} edited)")
+
+    def scroll_to(self, start):
+        start = max(0, min(int(start), max(len(self.store) - self.rows, 0)))
+        if start == self.start:
+            return
+        self.commit()
+        self.start = start
+        self.render()
+
+    def _scroll_lines(self, delta):
+        self.scroll_to(self.start + delta)
+        return 'break'
+
+    def _on_scrollbar(self, *args):
+        if args[0] == 'moveto':
+            self.scroll_to(float(args[1]) * len(self.store))
+        elif args[0] == 'scroll':
+            step = self.rows if args[2] == 'pages' else 1
+            self.scroll_to(self.start + int(args[1]) * step)
+
+    def _on_up(self, event):
+        if self.text.index('insert').startswith('1.') and self.start > 0:
+            self._scroll_lines(-1)
+            return 'break'
+
+    def _on_down(self, event):
+        last_line = int(self.text.index('end-1c').split('.')[0])
+        if int(self.text.index('insert').split('.')[0]) == last_line:
+            self._scroll_lines(1)
+            return 'break'
+
+    def _on_resize(self, event):
+        rows = max(event.height // self._linespace, 1)
+        if rows != self.rows:
+            self.commit()
+            self.rows = rows
+            self.render()
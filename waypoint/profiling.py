@@ -0,0 +1,99 @@
+"""Per-stage wall-clock profile of a generation run.
+
+A ``StageProfile`` is passed down the pipeline like ``RouteStats`` or
+``RejectReport`` and timed around each stage (read, parse, route, distances,
+pwms, format, write). Stages may nest and time is exclusive: while a nested
+stage runs, the enclosing one is paused. So when ``write_mission`` pulls lines
+out of the streaming generator, the CSV reading and parsing that this triggers
+count towards ``read`` and ``parse``, and not towards ``format``. Timing is
+per chunk or per write batch, never per line, so profiling costs practically
+nothing.
+
+``track_memory=True`` also records the peak traced allocation of the run with
+``tracemalloc`` (numpy and pandas buffers included), at a noticeable
+slowdown.
+"""
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+_DONE = object()
+
+class StageProfile:
+    """Exclusive seconds and call counts per stage name, in first-seen order."""
+
+    def __init__(self, track_memory=False):
+        self.seconds = {}
+        self.calls = {}
+        self.track_memory = track_memory
+        self.peak_bytes = None
+        self._stack = []
+        self._mark = 0.0
+        self._started = None
+        self._total = 0.0
+
+    def _switch(self):
+        now = time.perf_counter()
+        if self._stack:
+            self.seconds[self._stack[-1]] += now - self._mark
+        self._mark = now
+
+    @contextmanager
+    def stage(self, name):
+        """Time the body as stage ``name``, pausing any enclosing stage."""
+        self._switch()
+        self._stack.append(name)
+        self.seconds.setdefault(name, 0.0)
+        self.calls[name] = self.calls.get(name, 0) + 1
+        try:
+            yield
+        finally:
+            self._switch()
+            self._stack.pop()
+
+    def iterate(self, name, iterable):
+        """Yield from ``iterable``, timing each step of it as stage ``name`` (use for coarse items such as chunks)."""
+        iterator = iter(iterable)
+        while True:
+            with self.stage(name):
+                item = next(iterator, _DONE)
+            if item is _DONE:
+                return
+            yield item
+
+    @contextmanager
+    def run(self):
+        """Bracket a whole run: measures the total and, with ``track_memory``, the traced peak."""
+        if self.track_memory:
+            tracemalloc.start()
+            tracemalloc.reset_peak()
+        started = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self._total += time.perf_counter() - started
+            if self.track_memory:
+                self.peak_bytes = max(self.peak_bytes or 0, tracemalloc.get_traced_memory()[1])
+                tracemalloc.stop()
+
+    def total(self):
+        """Seconds inside ``run()``, or the sum of the stages if it was not used."""
+        return self._total or sum(self.seconds.values())
+
+    def __str__(self):
+        total = self.total()
+        parts = ", ".join(f"{name} {seconds:.3f}s" for name, seconds in self.seconds.items())
+        return f"{total:.3f}s total ({parts})"
+
+    def as_dict(self):
+        return {
+            'total_seconds': self.total(),
+            'peak_memory_bytes': self.peak_bytes,
+            'stages': {name: {'seconds': seconds, 'calls': self.calls[name]} for name, seconds in self.seconds.items()},
+        }
+
+    def write_json(self, path, **extra):
+        """Write the profile (plus any ``extra`` keys, e.g. the input file) to ``path`` as JSON."""
+        with open(path, 'w', encoding='utf-8') as outfile:
+            json.dump(dict(extra, **self.as_dict()), outfile, indent=2)
@@ -0,0 +1,356 @@
+"""Visit-order optimization for grid points.
+
+Points are projected to local metres (``geodesy.local_xy``) and bucketed into
+a uniform grid of square cells holding one or two points each; that grid is
+the spatial index behind every mode:
+
+``'csv'``
+    Keep the CSV row order (the default).
+``'nearest'``
+    Greedy nearest-neighbour tour from the first CSV point (above
+    ``NEAREST_MAX_POINTS`` the pure-Python greedy walk is too slow and a
+    Hilbert-curve order seeds the tour instead), then 2-opt and Or-opt (moving
+    runs of 1-3 points) against each point's nearest neighbours. Each pass
+    evaluates every candidate move at once with NumPy and applies a
+    non-overlapping subset; passes stop when nothing improves or the next one
+    would overrun ``time_budget`` seconds, counted from the start of the call,
+    so 100k points stay under a second by default.
+``'boustrophedon'``
+    Lawnmower sweep for regular grids: the grid orientation is taken from the
+    nearest-neighbour directions, points are binned into rows and rows are
+    flown alternately forward and back. Of the two sweep axes and four start
+    corners the shortest sweep is used.
+
+The path is open: it starts at the first CSV point (next to home) and ends
+wherever the tour finishes. ``'nearest'`` results depend on ``time_budget``
+and machine speed only when the budget runs out before convergence.
+"""
+import bisect
+import itertools
+import math
+import time
+import numpy as np
+from geodesy import local_xy
+
+ROUTE_MODES = ('csv', 'nearest', 'boustrophedon')
+DEFAULT_TIME_BUDGET = 0.9
+NEIGHBOURS = 6
+RING_LIMIT = 3  # Rings of cells searched before the nearest-neighbour step falls back to a full scan
+NEAREST_MAX_POINTS = 20_000  # Larger fields seed the tour from a Hilbert curve instead
+HILBERT_BITS = 16
+MAX_MOVES_PER_PASS = 20_000
+
+class RouteStats:
+    """Path length before and after ordering, filled in by ``optimize_route``."""
+
+    def __init__(self):
+        self.mode = 'csv'
+        self.length_before = 0.0
+        self.length_after = 0.0
+        self.seconds = 0.0
+
+    def __str__(self):
+        return (f"{self.mode} route: path {self.length_before / 1000:.2f} km -> "
+                f"{self.length_after / 1000:.2f} km in {self.seconds:.2f} s")
+
+def path_length(x, y, order=None):
+    """Return the length of the open path through (x, y) in ``order`` (default: as given)."""
+    if order is not None:
+        x, y = x[order], y[order]
+    return float(np.hypot(np.diff(x), np.diff(y)).sum())
+
+class _GridIndex:
+    """Uniform-cell bucket index over 2-D points; cells are sized for one or two points each."""
+
+    def __init__(self, x, y):
+        n = x.size
+        span = max(x.max() - x.min(), y.max() - y.min(), 1e-9)
+        cell = max(math.sqrt((x.max() - x.min()) * (y.max() - y.min()) / n), span / n) * 1.2
+        for _ in range(8):
+            # Clustered fields leave most of the bounding box empty; shrink until buckets are small
+            ix = np.floor((x - x.min()) / cell).astype(np.int64)
+            iy = np.floor((y - y.min()) / cell).astype(np.int64)
+            keys = ix * (iy.max() + 3) + iy
+            occupied = np.unique(keys).size
+            if n / occupied <= 4:
+                break
+            cell /= math.sqrt(n / occupied / 2)
+        self.cell = cell
+        self.stride = int(iy.max()) + 3
+        self.ix, self.iy = ix, iy
+        self.keys = keys
+        self.order = np.argsort(keys, kind='stable')
+        self.cell_keys, self.starts, self.counts = np.unique(keys[self.order], return_index=True, return_counts=True)
+
+    def buckets(self):
+        """Return {cell key: [point indices]} for incremental removal."""
+        groups = np.split(self.order, self.starts[1:])
+        return {key: group.tolist() for key, group in zip(self.cell_keys.tolist(), groups)}
+
+    def knn(self, x, y, k):
+        """Return (neighbours, distances), each (n, k): nearest points among the 3x3 surrounding cells.
+
+        Missing neighbours (sparse areas) are filled with the point itself at distance 0.
+        """
+        # Work in cell-sorted positions so candidate cells are contiguous slices
+        n = x.size
+        xs, ys = x[self.order], y[self.order]
+        keys = self.keys[self.order]
+        queries, candidates = [], []
+        for dx in (-1, 0, 1):
+            for dy in (-1, 0, 1):
+                target = keys + (dx * self.stride + dy)
+                slot = np.minimum(np.searchsorted(self.cell_keys, target), self.cell_keys.size - 1)
+                points = np.flatnonzero(self.cell_keys[slot] == target)
+                counts = self.counts[slot[points]]
+                # Positions starts[c] .. starts[c] + counts[c] - 1 of every found cell c
+                first = np.repeat(self.starts[slot[points]] - np.cumsum(counts) + counts, counts)
+                queries.append(np.repeat(points, counts))
+                candidates.append(first + np.arange(first.size))
+        queries = np.concatenate(queries)
+        candidates = np.concatenate(candidates)
+        keep = queries != candidates
+        queries, candidates = queries[keep], candidates[keep]
+        d = np.hypot(xs[queries] - xs[candidates], ys[queries] - ys[candidates])
+        # One sort by point, then distance: the fraction stays below 1 so points never mix
+        by_point = np.argsort(queries + d / (2 * d.max() + 1e-300) if d.size else queries)
+        queries, candidates, d = queries[by_point], candidates[by_point], d[by_point]
+        group_first = np.flatnonzero(np.r_[True, queries[1:] != queries[:-1]]) if queries.size else queries
+        rank = np.arange(queries.size) - np.repeat(group_first, np.diff(np.r_[group_first, queries.size]))
+        take = rank < k
+        neighbours = np.repeat(np.arange(n)[:, None], k, axis=1)
+        distances = np.zeros((n, k))
+        rows = self.order[queries[take]]
+        neighbours[rows, rank[take]] = self.order[candidates[take]]
+        distances[rows, rank[take]] = d[take]
+        return neighbours, distances
+
+def _nearest_neighbour_tour(x, y, index, start=0):
+    """Greedy nearest-neighbour path from ``start`` using the bucket index."""
+    n = x.size
+    buckets = index.buckets()
+    xs, ys = x.tolist(), y.tolist()
+    cell_ix, cell_iy = index.ix.tolist(), index.iy.tolist()
+    stride, cell = index.stride, index.cell
+    rings = [[(0, 0)]] + [[(dx, dy) for dx in range(-r, r + 1) for dy in range(-r, r + 1) if max(abs(dx), abs(dy)) == r]
+                          for r in range(1, RING_LIMIT + 1)]
+    visited = np.zeros(n, dtype=bool)
+    remaining = np.arange(n)
+    tour = [start]
+    current = start
+    for _ in range(n - 1):
+        visited[current] = True
+        buckets[cell_ix[current] * stride + cell_iy[current]].remove(current)
+        px, py = xs[current], ys[current]
+        base = cell_ix[current] * stride + cell_iy[current]
+        best, best_d2 = -1, math.inf
+        for r, ring in enumerate(rings):
+            for dx, dy in ring:
+                for j in buckets.get(base + dx * stride + dy, ()):
+                    d2 = (xs[j] - px) ** 2 + (ys[j] - py) ** 2
+                    if d2 < best_d2:
+                        best, best_d2 = j, d2
+            # Anything beyond ring r is at least r cells away
+            if best >= 0 and best_d2 <= (r * cell) ** 2:
+                break
+        else:
+            if remaining.size > 2 * (n - len(tour)):
+                remaining = remaining[~visited[remaining]]
+            candidates = remaining[~visited[remaining]]
+            d2 = (x[candidates] - px) ** 2 + (y[candidates] - py) ** 2
+            best = int(candidates[np.argmin(d2)])
+        tour.append(best)
+        current = best
+    return np.array(tour, dtype=np.int64)
+
+def _hilbert_tour(x, y, start=0):
+    """Order points along a Hilbert curve over their bounding box, rotated to begin at ``start``."""
+    side = (1 << HILBERT_BITS) - 1
+    scale = side / max(np.ptp(x), np.ptp(y), 1e-9)
+    xi = np.round((x - x.min()) * scale).astype(np.int64)
+    yi = np.round((y - y.min()) * scale).astype(np.int64)
+    d = np.zeros(x.size, dtype=np.int64)
+    s = 1 << (HILBERT_BITS - 1)
+    while s > 0:
+        rx = (xi & s) > 0
+        ry = (yi & s) > 0
+        d += s * s * ((3 * rx) ^ ry)
+        flip = rx & ~ry
+        xi = np.where(flip, s - 1 - xi, xi)
+        yi = np.where(flip, s - 1 - yi, yi)
+        xi, yi = np.where(ry, xi, yi), np.where(ry, yi, xi)
+        s //= 2
+    tour = np.argsort(d, kind='stable')
+    # Start at ``start`` and fly the curve from there in the direction of its longer part
+    at = int(np.flatnonzero(tour == start)[0])
+    if at >= tour.size - 1 - at:
+        return np.concatenate((tour[at::-1], tour[at + 1:]))
+    return np.concatenate((tour[at:], tour[:at][::-1]))
+
+def _select_disjoint(lo, hi, gain):
+    """Pick moves by decreasing gain whose closed position intervals [lo, hi] do not overlap."""
+    if gain.size > MAX_MOVES_PER_PASS:
+        top = np.argpartition(-gain, MAX_MOVES_PER_PASS)[:MAX_MOVES_PER_PASS]
+        lo, hi, gain = lo[top], hi[top], gain[top]
+    else:
+        top = np.arange(gain.size)
+    chosen = []
+    taken = []  # Sorted, alternating interval starts/ends of the chosen moves
+    lo_list, hi_list = lo.tolist(), hi.tolist()
+    for m in np.argsort(-gain, kind='stable').tolist():
+        a, b = lo_list[m], hi_list[m]
+        i = bisect.bisect_left(taken, a)
+        if i % 2 == 1 or (i < len(taken) and taken[i] <= b):
+            continue
+        taken[i:i] = (a, b)
+        chosen.append(int(top[m]))
+    return chosen
+
+class _TourState:
+    """Per-pass view of a tour by position: coordinates, edge lengths and neighbour positions."""
+
+    def __init__(self, tour, x, y, neighbours, neighbour_dist):
+        n = tour.size
+        self.n = n
+        self.tx, self.ty = x[tour], y[tour]
+        self.edge = np.hypot(np.diff(self.tx), np.diff(self.ty))  # edge[i] joins positions i and i + 1
+        pos = np.empty(n, dtype=np.int64)
+        pos[tour] = np.arange(n)
+        self.nb_pos = pos[neighbours[tour]]
+        self.nb_dist = neighbour_dist[tour]
+
+    def dist(self, a, b):
+        return np.hypot(self.tx[a] - self.tx[b], self.ty[a] - self.ty[b])
+
+def _two_opt_pass(tour, x, y, neighbours, neighbour_dist):
+    """Apply non-overlapping improving 2-opt moves; returns the number applied."""
+    st = _TourState(tour, x, y, neighbours, neighbour_dist)
+    n = st.n
+    edge_or_zero = np.r_[st.edge, 0.0]  # No edge after the last position
+    # Reverse positions lo + 1 .. hi: edges (lo, lo+1) and (hi, hi+1) become (lo, hi) and (lo+1, hi+1)
+    i = np.arange(n - 1)[:, None]
+    j = st.nb_pos[:-1]
+    lo, hi = np.minimum(i, j), np.maximum(i, j)
+    bound = edge_or_zero[lo] + edge_or_zero[hi] - st.nb_dist[:-1]
+    rows, cols = np.nonzero((hi - lo >= 2) & (bound > 1e-9))
+    lo, hi, gain = lo[rows, cols], hi[rows, cols], bound[rows, cols]
+    inner = hi < n - 1
+    gain[inner] -= st.dist(lo[inner] + 1, hi[inner] + 1)
+    better = gain > 1e-9
+    lo, hi, gain = lo[better], hi[better], gain[better]
+    chosen = _select_disjoint(lo, np.minimum(hi + 1, n - 1), gain)
+    for m in chosen:
+        tour[lo[m] + 1:hi[m] + 1] = tour[lo[m] + 1:hi[m] + 1][::-1].copy()
+    return len(chosen)
+
+def _or_opt_pass(tour, x, y, neighbours, neighbour_dist):
+    """Apply non-overlapping improving moves of 1-3 point runs; returns the number applied."""
+    st = _TourState(tour, x, y, neighbours, neighbour_dist)
+    n = st.n
+    edge_or_zero = np.r_[st.edge, 0.0]  # No edge after the last position
+    moves = []
+    for length in (1, 2, 3):
+        # Runs occupy positions s .. e; the first point stays first
+        s = np.arange(1, n - length + 1)
+        e = s + length - 1
+        after = np.minimum(e + 1, n - 1)
+        removal = st.edge[s - 1] + np.where(e == n - 1, 0.0, edge_or_zero[e] - st.dist(s - 1, after))
+        for reverse in (False, True):
+            # Insert the run after position q, a neighbour of the run end that will touch tour[q]
+            touching = slice(length, n) if reverse else slice(1, n - length + 1)
+            q = st.nb_pos[touching]
+            bound = removal[:, None] - st.nb_dist[touching] + edge_or_zero[q]
+            rows, cols = np.nonzero((bound > 1e-9) & ((q < s[:, None] - 1) | (q > e[:, None])))
+            q, gain = q[rows, cols], bound[rows, cols]
+            inner = q < n - 1
+            other_end = (s if reverse else e)[rows[inner]]
+            gain[inner] -= st.dist(other_end, q[inner] + 1)
+            better = gain > 1e-9
+            if better.any():
+                moves.append((s[rows[better]], e[rows[better]], q[better], np.full(better.sum(), reverse), gain[better]))
+    if not moves:
+        return 0
+    s, e, q, reverse, gain = (np.concatenate(parts) for parts in zip(*moves))
+    lo = np.where(q > e, s - 1, q)
+    hi = np.minimum(np.where(q > e, q + 1, e + 1), n - 1)
+    chosen = _select_disjoint(lo, hi, gain)
+    for m in chosen:
+        sm, em, qm, lom, him = int(s[m]), int(e[m]), int(q[m]), int(lo[m]), int(hi[m])
+        run = tour[sm:em + 1][::-1] if reverse[m] else tour[sm:em + 1]
+        if qm > em:
+            pieces = (tour[lom:lom + 1], tour[em + 1:qm + 1], run, tour[qm + 1:him + 1])
+        else:
+            pieces = (tour[lom:lom + 1], run, tour[qm + 1:sm], tour[em + 1:him + 1])
+        tour[lom:him + 1] = np.concatenate(pieces)
+    return len(chosen)
+
+def _improve(tour, x, y, neighbours, neighbour_dist, deadline):
+    """Alternate 2-opt and Or-opt passes until neither improves or the next pass would miss the deadline."""
+    last_pass = 0.0
+    for improve_pass in itertools.cycle((_two_opt_pass, _or_opt_pass)):
+        started = time.perf_counter()
+        if started + last_pass > deadline:
+            break
+        moved = improve_pass(tour, x, y, neighbours, neighbour_dist)
+        last_pass = time.perf_counter() - started
+        if improve_pass is _or_opt_pass:
+            if not moved and not moved_2opt:
+                break
+        else:
+            moved_2opt = moved
+    return tour
+
+def _boustrophedon(x, y, index):
+    """Row-by-row lawnmower order along whichever grid axis and start corner give the shortest path."""
+    nearest = index.knn(x, y, 1)[0][:, 0]
+    found = nearest != np.arange(x.size)
+    dx, dy = x[nearest[found]] - x[found], y[nearest[found]] - y[found]
+    spacing = np.median(np.hypot(dx, dy)) if found.any() else index.cell
+    # Grid directions repeat every 90 degrees, so average the angles multiplied by four
+    theta = 4 * np.arctan2(dy, dx)
+    angle = math.atan2(np.sin(theta).sum(), np.cos(theta).sum()) / 4
+    u = x * math.cos(angle) + y * math.sin(angle)
+    v = -x * math.sin(angle) + y * math.cos(angle)
+    best = None
+    for along, across in ((u, v), (v, u)):
+        rows = np.floor((across - across.min()) / max(spacing, 1e-9) + 0.5).astype(np.int64)
+        _, rank = np.unique(rows, return_inverse=True)
+        for flip_rows in (False, True):
+            r = rank.max() - rank if flip_rows else rank
+            for flip_first in (False, True):
+                direction = np.where((r % 2 == 1) != flip_first, -1.0, 1.0)
+                order = np.lexsort((along * direction, r))
+                # Shortest sweep, counting the hop from the first CSV point to where it starts
+                length = path_length(x, y, order) + math.hypot(x[order[0]] - x[0], y[order[0]] - y[0])
+                if best is None or length < best[0]:
+                    best = (length, order)
+    return best[1]
+
+def optimize_route(lats, lons, mode='nearest', time_budget=DEFAULT_TIME_BUDGET, stats=None):
+    """Return the visit order (indices into ``lats``/``lons``) for ``mode``; see ROUTE_MODES.
+
+    Pass a RouteStats as ``stats`` to get the path length before and after.
+    """
+    if mode not in ROUTE_MODES:
+        raise ValueError(f"Unknown route mode {mode!r}; expected one of {ROUTE_MODES}")
+    started = time.perf_counter()
+    x, y = local_xy(lats, lons)
+    n = x.size
+    if mode == 'csv' or n < 3:
+        order = np.arange(n)
+    else:
+        index = _GridIndex(x, y)
+        if mode == 'boustrophedon':
+            order = _boustrophedon(x, y, index)
+        else:
+            if n <= NEAREST_MAX_POINTS:
+                order = _nearest_neighbour_tour(x, y, index)
+            else:
+                order = _hilbert_tour(x, y)
+            _improve(order, x, y, *index.knn(x, y, NEIGHBOURS), started + time_budget)
+    if stats is not None:
+        stats.mode = mode
+        stats.length_before = path_length(x, y)
+        stats.length_after = path_length(x, y, order)
+        stats.seconds = time.perf_counter() - started
+    return order
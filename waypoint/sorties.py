@@ -0,0 +1,113 @@
+"""Multi-sortie planning: split one field into missions that fit a hopper load, a battery and the item limit.
+
+The field is planned once (parsed and put in visit order, see ``routing``) and
+the flown path is then cut into consecutive sorties, each as long as possible
+without exceeding any of:
+
+* ``max_grams``: total fertilizer per hopper load;
+* ``max_flight_s``: flight time at ``speed`` from home to the first point,
+  along the sortie's legs and back home from its last point;
+* ``max_items``: mission items including home, takeoff and the servo
+  init/shutdown blocks.
+
+Cutting a routed path keeps every sortie to one contiguous stretch of the
+tour, so with ``route_mode='nearest'`` (the default here) sorties are
+spatially compact. Each sortie becomes a complete mission with its own
+prologue and epilogue, exactly as ``generate_waypoints`` would emit it for
+those points, and can be written independently (e.g. in parallel processes).
+"""
+import os
+import numpy as np
+from compaction import CompactionStats, compact_lines
+from geodesy import pairwise_distances
+from mission import format_mission_lines, point_pwms, write_mission
+from plan import build_plan
+
+class Sortie:
+    """One stretch of the planned path: points ``start`` to ``stop - 1`` plus their totals."""
+
+    def __init__(self, number, start, stop, lats, lons, grams, distance_m, flight_s, item_count):
+        self.number = number
+        self.start = start
+        self.stop = stop
+        self.lats = lats
+        self.lons = lons
+        self.grams = grams
+        self.distance_m = distance_m  # Including the transit legs from and back to home
+        self.flight_s = flight_s
+        self.item_count = item_count
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __str__(self):
+        return (f"sortie {self.number}: {len(self)} points, {self.grams.sum():.1f} g, "
+                f"{self.distance_m / 1000:.2f} km, {self.flight_s / 60:.1f} min, {self.item_count} items")
+
+def partition_sorties(home, lats, lons, grams, distances, speed, overhead_items, max_grams=None, max_flight_s=None, max_items=None, distance_mode='ellipsoidal'):
+    """Cut points flown in the given order into Sorties; ``distances`` are the N-1 leg lengths.
+
+    ``overhead_items`` is the number of prologue and epilogue items per mission.
+    Without points this is a single empty sortie (prologue and epilogue only),
+    the mission ``generate_waypoints`` writes for an empty field. Raises
+    ValueError if a limit cannot be met even by a single point.
+    """
+    n = lats.size
+    if n == 0:
+        return [Sortie(1, 0, 0, lats, lons, grams, 0.0, 0.0, overhead_items)]
+    if max_flight_s is not None and speed <= 0:
+        raise ValueError("A flight time limit needs a positive speed")
+    cum_leg = np.concatenate(([0.0], np.cumsum(distances)))
+    cum_grams = np.concatenate(([0.0], np.cumsum(grams)))
+    to_home = pairwise_distances(np.full(n, home[0]), np.full(n, home[1]), lats, lons, distance_mode)
+    max_points = n
+    if max_items is not None:
+        max_points = (max_items - overhead_items) // 2
+        if max_points < 1:
+            raise ValueError(f"An item limit of {max_items} leaves no room for waypoints after {overhead_items} fixed items")
+    sorties = []
+    start = 0
+    while start < n:
+        stop = min(n, start + max_points)
+        if max_grams is not None:
+            # Points start .. stop - 1 whose running total stays within one hopper load
+            stop = min(stop, int(np.searchsorted(cum_grams, cum_grams[start] + max_grams, side='right')) - 1)
+        path = to_home[start] + cum_leg[start:stop] - cum_leg[start] + to_home[start:stop]
+        if max_flight_s is not None:
+            too_long = np.flatnonzero(path / speed > max_flight_s)
+            if too_long.size:
+                stop = start + int(too_long[0])
+        if stop <= start:
+            raise ValueError(f"Point {start + 1} ({grams[start]:g} g, {2 * to_home[start]:.0f} m round trip) "
+                             f"does not fit in a single sortie")
+        distance = float(path[stop - start - 1])
+        sorties.append(Sortie(len(sorties) + 1, start, stop, lats[start:stop], lons[start:stop], grams[start:stop],
+                              distance, distance / speed if speed > 0 else 0.0, overhead_items + 2 * (stop - start)))
+        start = stop
+    return sorties
+
+def plan_sorties(input_csv, altitude, speed, valve_servo_channel, disc_servo_channel, disc_pwm, include_takeoff, distance_mode='ellipsoidal', route_mode='nearest', max_grams=None, max_flight_s=None, max_items=None, field_format=None):
+    """Parse and route ``input_csv`` and return (home, sorties, rejects), ``rejects`` being the parse's RejectReport."""
+    plan = build_plan(input_csv, altitude, speed, None, valve_servo_channel, disc_servo_channel, disc_pwm, include_takeoff,
+                      distance_mode, route_mode=route_mode, field_format=field_format)
+    overhead = len(plan.prologue) + len(plan.epilogue)
+    sorties = partition_sorties(plan.home, plan.lats, plan.lons, plan.grams, plan.distances, speed, overhead,
+                                max_grams, max_flight_s, max_items, distance_mode)
+    return plan.home, sorties, plan.rejects
+
+def sortie_path(output_path, number, total):
+    """Return the file for sortie ``number`` of ``total``, e.g. ``field_sortie02.waypoints`` for ``field.waypoints``."""
+    stem, ext = os.path.splitext(output_path)
+    return f"{stem}_sortie{number:0{max(2, len(str(total)))}d}{ext or '.waypoints'}"
+
+def write_sortie(sortie, output_path, home, altitude, speed, cal_points, valve_servo_channel, disc_servo_channel, disc_pwm, include_takeoff, distance_mode='ellipsoidal', pwm_resolution=None, compact=False, merge_tolerance_m=None):
+    """Write one sortie as a complete mission; safe to run in a worker process. Returns a one-line summary."""
+    pwms = point_pwms(sortie.lats, sortie.lons, sortie.grams, speed, cal_points, distance_mode, pwm_resolution)
+    lines = format_mission_lines(home, [(sortie.lats.tolist(), sortie.lons.tolist(), pwms)], altitude,
+                                 valve_servo_channel, disc_servo_channel, disc_pwm, include_takeoff)
+    if compact:
+        stats = CompactionStats()
+        write_mission(compact_lines(lines, merge_tolerance_m, stats), output_path)
+        return f"{sortie}, compacted {stats}"
+    write_mission(lines, output_path)
+    return str(sortie)
@@ -0,0 +1,69 @@
+"""Synthetic fields and calibration curves for benchmarks and load tests.
+
+Usage example::
+
+    python synthetic.py 100000 field.csv --calibration cal.csv
+
+Fields are near-square grids with ``spacing_m`` between points. They are
+flown row by row in alternating directions, like a surveyed field, near the
+sample field's location, with random fertilizer quantities. Calibration
+curves are strictly increasing dispense rates at 100 µs Valve steps with a
+random shape. Both are seeded, so a given size always produces the same files.
+"""
+import argparse
+import math
+import numpy as np
+import pandas as pd
+from geodesy import WGS84_A
+from ingest import COORDINATE_COLUMNS, FERTILIZER_COLUMN
+
+BASE_LAT = 12.9351
+BASE_LON = 77.6103
+DEFAULT_SPACING_M = 5.0
+GRAMS_RANGE = (2.0, 9.0)
+CALIBRATION_PWMS = np.arange(1000, 2001, 100)
+
+def synthetic_points(n, spacing_m=DEFAULT_SPACING_M, seed=0):
+    """Return (lats, lons, grams) arrays for an ``n``-point serpentine grid."""
+    rng = np.random.default_rng(seed)
+    columns = max(1, math.ceil(math.sqrt(n)))
+    k = np.arange(n)
+    row, column = k // columns, k % columns
+    column = np.where(row % 2 == 1, columns - 1 - column, column)
+    lats = BASE_LAT + np.degrees(row * spacing_m / WGS84_A)
+    lons = BASE_LON + np.degrees(column * spacing_m / (WGS84_A * math.cos(math.radians(BASE_LAT))))
+    grams = np.round(rng.uniform(*GRAMS_RANGE, n), 2)
+    return lats, lons, grams
+
+def write_field_csv(path, lats, lons, grams, coordinate_column=COORDINATE_COLUMNS[0]):
+    """Write points in the tool's input format (Grids, Fertilizer, "lat, lon")."""
+    coordinates = [f"{lat:.7f}, {lon:.7f}" for lat, lon in zip(lats.tolist(), lons.tolist())]
+    pd.DataFrame({'Grids': np.arange(1, lats.size + 1), FERTILIZER_COLUMN: grams, coordinate_column: coordinates}).to_csv(path, index=False)
+
+def synthetic_calibration(seed=0):
+    """Return (pwms, rates) of a random, strictly increasing valve curve from about 0.2 to 8 g/s."""
+    rng = np.random.default_rng(seed)
+    x = (CALIBRATION_PWMS - CALIBRATION_PWMS[0]) / (CALIBRATION_PWMS[-1] - CALIBRATION_PWMS[0])
+    rates = 0.2 + 7.8 * x ** rng.uniform(0.7, 1.6)
+    rates += np.cumsum(rng.uniform(0.0, 0.05, x.size))  # Keeps the curve strictly increasing but uneven
+    return CALIBRATION_PWMS.copy(), np.round(rates, 3)
+
+def write_calibration_csv(path, seed=0):
+    """Write a synthetic curve with the Valve and Avg quantity(g) columns ``load_calibration_csv`` expects."""
+    pwms, rates = synthetic_calibration(seed)
+    pd.DataFrame({'Valve': pwms, 'Avg quantity(g)': rates}).to_csv(path, index=False)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic field CSV (and optionally a calibration CSV).")
+    parser.add_argument('points', type=int, help="Number of grid points")
+    parser.add_argument('output', help="Field CSV to write")
+    parser.add_argument('--calibration', help="Also write a synthetic calibration CSV here")
+    parser.add_argument('--spacing', type=float, default=DEFAULT_SPACING_M, help=f"Grid spacing in metres (default: {DEFAULT_SPACING_M:g})")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed (default: 0)")
+    args = parser.parse_args(argv)
+    write_field_csv(args.output, *synthetic_points(args.points, args.spacing, args.seed))
+    if args.calibration:
+        write_calibration_csv(args.calibration, args.seed)
+
+if __name__ == '__main__':
+    main()
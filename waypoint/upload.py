@@ -0,0 +1,311 @@
+"""Direct mission upload over MAVLink (UDP or serial) with read-back verification.
+
+Usage example::
+
+    python upload.py field.waypoints --connect udpout:127.0.0.1:14550
+
+The upload follows the MAVLink mission protocol: MISSION_COUNT, then the
+vehicle asks for items with MISSION_REQUEST_INT and finishes with a
+MISSION_ACK. Items are encoded as MISSION_ITEM_INT before the transfer starts.
+Each request is answered straight away, and up to ``window - 1`` further items
+are sent ahead of it, so a vehicle that buffers out-of-order items (such as
+``mock_autopilot``) needs about one round trip per window instead of one per
+item. Strict autopilots ignore the items sent ahead and request them again,
+which costs bandwidth but no extra round trips.
+
+* A request for an item already sent is answered by sending it again.
+* When no request arrives for ``STALL_FACTOR`` times the usual gap between
+  requests (at least ``MIN_STALL`` and at most ``timeout`` seconds), the items
+  from the last request on (or the count) are sent again, plus one window
+  beyond. A lost request therefore costs a few round trips, not a whole
+  timeout.
+* After ``retries`` consecutive periods of ``timeout`` seconds without a
+  request, the upload fails.
+
+Verification downloads the mission with up to ``window`` requests in flight.
+A request is repeated on its own once it has gone unanswered for ``timeout``,
+or as soon as a later request is answered first. The download is then
+compared item by item, on the fields the vehicle actually stores.
+ArduPilot keeps the frame and location only for NAV commands, and keeps only
+some params (e.g. channel and PWM for DO_SET_SERVO, as integers). Everything
+else reads back as zero. Seq 0 is only checked for its command, because
+ArduPilot replaces the home position.
+"""
+import argparse
+import struct
+import sys
+import time
+from mavlink import DEFAULT_BAUD, MESSAGE_IDS, MESSAGES, MavlinkConnection, open_link
+
+MAV_MISSION_TYPE_MISSION = 0
+MAV_MISSION_ACCEPTED = 0
+MAV_MISSION_INVALID_SEQUENCE = 13
+MISSION_RESULTS = {
+    1: "error", 2: "unsupported frame", 3: "unsupported command", 4: "no space", 5: "invalid",
+    6: "invalid param1", 7: "invalid param2", 8: "invalid param3", 9: "invalid param4",
+    10: "invalid x", 11: "invalid y", 12: "invalid z", 13: "invalid sequence", 14: "denied",
+    15: "operation cancelled",
+}
+GLOBAL_FRAMES = {0, 3, 5, 6, 10, 11}  # x/y are latitude/longitude in degrees * 1e7
+DEFAULT_WINDOW = 8
+DEFAULT_TIMEOUT = 0.5
+DEFAULT_RETRIES = 10
+HEARTBEAT_TIMEOUT = 10.0
+STALL_FACTOR = 4       # An upload has stalled after this many typical gaps between requests...
+MIN_STALL = 0.02       # ...but never less than this many seconds
+REQUESTS = ('MISSION_REQUEST_INT', 'MISSION_REQUEST', 'MISSION_ACK')
+_ITEM_FIELDS = MESSAGES[MESSAGE_IDS['MISSION_ITEM_INT']][3]
+_ITEM_STRUCT = struct.Struct(MESSAGES[MESSAGE_IDS['MISSION_ITEM_INT']][2])
+MAV_CMD_NAV_LAST = 95  # Commands below this are NAV commands, stored with their frame and location
+STORED_PARAMS = {      # Params compared (as integers) per command; all four are compared as sent for others
+    16: (),                     # NAV_WAYPOINT: hold time on Copter, acceptance/pass radius on Plane
+    22: (),                     # NAV_TAKEOFF: pitch, Plane only
+    183: ('param1', 'param2'),  # DO_SET_SERVO: channel and PWM
+}
+
+class UploadError(Exception):
+    """Raised when the vehicle rejects the mission, stops answering or reads back something else."""
+
+class UploadStats:
+    """Counters filled in by ``upload_mission`` and ``download_mission``."""
+
+    def __init__(self):
+        self.items = 0
+        self.sent = 0
+        self.retransmits = 0
+        self.timeouts = 0
+        self.seconds = 0.0
+        self.verified = False
+
+    def __str__(self):
+        rate = self.items / self.seconds if self.seconds > 0 else 0.0
+        text = (f"{self.items} items in {self.seconds:.2f} s ({rate:.0f} items/s, {self.sent} sent, "
+                f"{self.retransmits} retransmitted, {self.timeouts} timeouts)")
+        return text + (", verified" if self.verified else "")
+
+def mission_items(lines):
+    """Return MISSION_ITEM_INT field dicts for QGC WPL 110 ``lines`` (header first, as written by ``write_mission``)."""
+    lines = iter(lines)
+    header = next(lines, '')
+    if not header.startswith('QGC WPL'):
+        raise ValueError("Not a QGC WPL mission: missing 'QGC WPL 110' header")
+    items = []
+    for line in lines:
+        if not line.strip():
+            continue
+        fields = line.split('\t')
+        if len(fields) != 12:
+            raise ValueError(f"Mission item {len(items)} has {len(fields)} fields instead of 12")
+        frame = int(fields[2])
+        scale = 1e7 if frame in GLOBAL_FRAMES else 1
+        items.append({
+            'seq': len(items), 'current': int(fields[1]), 'frame': frame, 'command': int(fields[3]),
+            'param1': float(fields[4]), 'param2': float(fields[5]), 'param3': float(fields[6]), 'param4': float(fields[7]),
+            'x': int(round(float(fields[8]) * scale)), 'y': int(round(float(fields[9]) * scale)),
+            'z': float(fields[10]), 'autocontinue': int(float(fields[11])),
+        })
+    return items
+
+def read_mission(path):
+    """Return the MISSION_ITEM_INT field dicts of a ``.waypoints`` file."""
+    with open(path, encoding='utf-8') as infile:
+        return mission_items(line.rstrip('\r\n') for line in infile)
+
+def _result_name(result):
+    return MISSION_RESULTS.get(result, f"result {result}")
+
+def upload_mission(conn, items, target_system, target_component, window=DEFAULT_WINDOW, timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES, stats=None, progress=None):
+    """Upload ``items`` (see ``mission_items``) over a MavlinkConnection.
+
+    ``progress(stage, done, total)`` is called with stage ``'upload'`` as the
+    vehicle requests items. Raises UploadError if the vehicle rejects the
+    mission or stays silent for ``retries`` consecutive timeouts.
+    """
+    stats = stats if stats is not None else UploadStats()
+    count = len(items)
+    target = dict(target_system=target_system, target_component=target_component, mission_type=MAV_MISSION_TYPE_MISSION)
+    items = [dict(item, **target) for item in items]
+    started = time.perf_counter()
+    next_new = 0          # First item never sent
+    last_request = None   # Seq of the most recent request
+    silent = 0
+    gap = timeout         # Smoothed time between requests
+    heard = counted = started
+
+    def send_item(seq):
+        conn.send('MISSION_ITEM_INT', **items[seq])
+        stats.sent += 1
+
+    conn.send('MISSION_COUNT', count=count, **target)
+    while True:
+        message = conn.recv_match(REQUESTS, min(timeout, max(MIN_STALL, STALL_FACTOR * gap)), system=target_system)
+        now = time.perf_counter()
+        if message is None:
+            if now - max(heard, counted) >= timeout:
+                counted = now
+                silent += 1
+                stats.timeouts += 1
+                if silent > retries:
+                    where = "the item count" if last_request is None else f"item {last_request} of {count}"
+                    raise UploadError(f"No answer from the vehicle after {retries} retries (waiting on {where})")
+            if last_request is None:
+                conn.send('MISSION_COUNT', count=count, **target)
+            else:
+                # Either the request or the items were lost: resend everything from the last request on,
+                # and send one more window in case the vehicle already had these and asked for the next
+                for seq in range(last_request, next_new):
+                    send_item(seq)
+                    stats.retransmits += 1
+                while next_new < min(last_request + 2 * window, count):
+                    send_item(next_new)
+                    next_new += 1
+            continue
+        if message.name == 'MISSION_ACK':
+            if message['type'] == MAV_MISSION_ACCEPTED and next_new >= count:
+                break
+            if message['type'] in (MAV_MISSION_ACCEPTED, MAV_MISSION_INVALID_SEQUENCE):
+                continue  # Stale ack, or an item sent ahead that a strict vehicle did not want yet
+            raise UploadError(f"Vehicle rejected the mission: {_result_name(message['type'])}")
+        seq = message['seq']
+        if seq >= count:
+            continue
+        silent = 0
+        gap += (now - heard - gap) / 4
+        heard = now
+        if seq < next_new:
+            stats.retransmits += 1
+        send_item(seq)
+        last_request = seq
+        next_new = max(next_new, seq + 1)
+        while next_new < min(seq + window, count):
+            send_item(next_new)
+            next_new += 1
+        if progress is not None:
+            progress('upload', seq + 1, count)
+    stats.items = count
+    stats.seconds = time.perf_counter() - started
+    return stats
+
+def download_mission(conn, target_system, target_component, window=DEFAULT_WINDOW, timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES, progress=None):
+    """Read the vehicle's mission back as MISSION_ITEM_INT field dicts, keeping up to ``window`` requests in flight."""
+    target = dict(target_system=target_system, target_component=target_component, mission_type=MAV_MISSION_TYPE_MISSION)
+    for _ in range(retries + 1):
+        conn.send('MISSION_REQUEST_LIST', **target)
+        message = conn.recv_match(('MISSION_COUNT',), timeout, system=target_system)
+        if message is not None:
+            break
+    else:
+        raise UploadError("Vehicle did not answer the mission download request")
+    count = message['count']
+    items = [None] * count
+    in_flight = {}  # Seq -> time of its latest request, oldest request first
+    next_seq = received = silent = 0
+
+    def request(seq):
+        conn.send('MISSION_REQUEST_INT', seq=seq, **target)
+        in_flight.pop(seq, None)
+        in_flight[seq] = time.monotonic()
+
+    while received < count:
+        while len(in_flight) < window and next_seq < count:
+            request(next_seq)
+            next_seq += 1
+        oldest = next(iter(in_flight))
+        message = conn.recv_match(('MISSION_ITEM_INT',), in_flight[oldest] + timeout - time.monotonic(), system=target_system)
+        if message is None:
+            silent += 1
+            if silent > retries:
+                raise UploadError(f"No answer from the vehicle after {retries} retries (reading item {oldest} of {count})")
+            now = time.monotonic()
+            for seq in [seq for seq, sent_at in in_flight.items() if now - sent_at >= timeout]:
+                request(seq)
+            continue
+        seq = message['seq']
+        if seq >= count or items[seq] is not None:
+            continue
+        silent = 0
+        items[seq] = message.fields
+        received += 1
+        answered_at = in_flight.pop(seq, None)
+        if answered_at is not None:
+            # Replies come back in request order, so requests made before this one are lost: ask again now
+            for earlier in [seq for seq, sent_at in in_flight.items() if sent_at < answered_at]:
+                request(earlier)
+        if progress is not None:
+            progress('verify', received, count)
+    conn.send('MISSION_ACK', type=MAV_MISSION_ACCEPTED, **target)
+    return items
+
+def _stored_values(item):
+    """The fields of ``item`` the vehicle stores, as they travel on the wire (float32), for comparison."""
+    wire = dict(zip(_ITEM_FIELDS, _ITEM_STRUCT.unpack(_ITEM_STRUCT.pack(*(item.get(name, 0) for name in _ITEM_FIELDS)))))
+    command = wire['command']
+    values = {'seq': wire['seq'], 'command': command}
+    if command < MAV_CMD_NAV_LAST:
+        values.update((name, wire[name]) for name in ('frame', 'x', 'y', 'z'))
+    params = STORED_PARAMS.get(command)
+    if params is None:
+        values.update((name, wire[name]) for name in ('param1', 'param2', 'param3', 'param4'))
+    else:
+        values.update((name, int(wire[name])) for name in params)
+    return values
+
+def verify_mission(expected, actual):
+    """Raise UploadError at the first item of ``actual`` that differs from ``expected``."""
+    if len(actual) != len(expected):
+        raise UploadError(f"Vehicle holds {len(actual)} items, {len(expected)} were uploaded")
+    for seq, (want, got) in enumerate(zip(expected, actual)):
+        if seq == 0:
+            if want['command'] != got['command']:
+                raise UploadError(f"Item 0 read back with command {got['command']} instead of {want['command']}")
+        elif _stored_values(want) != _stored_values(got):
+            raise UploadError(f"Item {seq} read back differently: sent {_stored_values(want)}, got {_stored_values(got)}")
+
+def send_mission(connection, items, baud=DEFAULT_BAUD, window=DEFAULT_WINDOW, timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES, verify=True, progress=None):
+    """Connect, wait for the vehicle's heartbeat, upload ``items`` and optionally verify them. Returns UploadStats."""
+    conn = MavlinkConnection(open_link(connection, baud))
+    try:
+        heartbeat = conn.wait_heartbeat(HEARTBEAT_TIMEOUT)
+        if heartbeat is None:
+            raise UploadError(f"No heartbeat from a vehicle on {connection} within {HEARTBEAT_TIMEOUT:.0f} s")
+        stats = upload_mission(conn, items, heartbeat.system, heartbeat.component, window, timeout, retries,
+                               progress=progress)
+        if verify:
+            verify_mission(items, download_mission(conn, heartbeat.system, heartbeat.component, window, timeout, retries,
+                                                   progress))
+            stats.verified = True
+        return stats
+    finally:
+        conn.close()
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Upload a .waypoints mission to an autopilot over MAVLink.")
+    parser.add_argument('mission', help="QGC WPL 110 .waypoints file")
+    parser.add_argument('--connect', required=True,
+                        help="udpin:HOST:PORT, udpout:HOST:PORT or a serial device such as /dev/ttyUSB0[:BAUD] or COM3")
+    parser.add_argument('--baud', type=int, default=DEFAULT_BAUD, help=f"Serial baud rate (default: {DEFAULT_BAUD})")
+    parser.add_argument('--window', type=int, default=DEFAULT_WINDOW,
+                        help=f"Items sent ahead per request and reads in flight (default: {DEFAULT_WINDOW})")
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, metavar='SECONDS',
+                        help=f"Silence before retransmitting (default: {DEFAULT_TIMEOUT})")
+    parser.add_argument('--retries', type=int, default=DEFAULT_RETRIES,
+                        help=f"Consecutive timeouts before giving up (default: {DEFAULT_RETRIES})")
+    parser.add_argument('--no-verify', action='store_true', help="Skip reading the mission back")
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.window < 1:
+        print("--window must be at least 1", file=sys.stderr)
+        return 2
+    try:
+        items = read_mission(args.mission)
+        stats = send_mission(args.connect, items, args.baud, args.window, args.timeout, args.retries, not args.no_verify)
+    except (OSError, ValueError, ImportError, UploadError) as e:
+        print(f"Upload failed: {e}", file=sys.stderr)
+        return 1
+    print(f"Uploaded {args.mission}: {stats}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
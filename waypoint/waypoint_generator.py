@@ -1,120 +1,103 @@
-from tkinter import filedialog, messagebox
+from tkinter import filedialog, messagebox, simpledialog
 import tkinter as tk
 from ttkbootstrap import Style
 import ttkbootstrap as ttk
 import pandas as pd
 import matplotlib.pyplot as plt
-from matplotlib.colors import Normalize
-from matplotlib.cm import ScalarMappable
-from geopy.distance import geodesic
+from matplotlib.figure import Figure
 import os
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image, ImageTk
+from compaction import CompactionStats, compact_lines
+from mission import load_calibration_csv
+from plan import PlanCancelled, get_plan
+from plotting import plot_plan
+from preview import MissionStore, PlanLines, VirtualPreview
+from routing import ROUTE_MODES
+from upload import mission_items, send_mission
+
+# Long-running work (CSV parsing, planning, export) runs here, one job at a time
+executor = ThreadPoolExecutor(max_workers=1)
+STAGE_LABELS = {
+    'parse': "Parsing rows",
+    'route': "Optimizing visit order",
+    'distances': "Computing leg distances",
+    'pwms': "Assigning PWMs",
+    'waypoint items': "Formatting waypoints",
+    'servo items': "Formatting servo commands",
+    'upload': "Uploading items",
+    'verify': "Reading mission back",
+}
+DEFAULT_CONNECTION = "udpin:0.0.0.0:14550"  # Where SITL/MAVProxy and most telemetry bridges send to
 
 def resource_path(relative_path: str) -> str:
     """Return absolute path to resource for PyInstaller bundles."""
     base_path = getattr(sys, "_MEIPASS", os.path.dirname(os.path.abspath(__file__)))
     return os.path.join(base_path, relative_path)
 
-def interpolate_pwm(grams, time_seconds, cal_points):
-    """Interpolate PWM value based on required dispense rate and calibration points."""
-    pwms = sorted(cal_points.keys())
-    if not pwms:
-        return 1000  # Default PWM if no calibration points
-    # Calculate required dispense rate (grams per second)
-    target_rate = grams / time_seconds if time_seconds > 0 else grams
-    # Find the PWM value that achieves the closest flow rate to target_rate
-    for i in range(len(pwms) - 1):
-        pwm1, pwm2 = pwms[i], pwms[i + 1]
-        rate1, rate2 = cal_points[pwm1], cal_points[pwm2]
-        if rate1 <= target_rate <= rate2:
-            # Linear interpolation
-            slope = (pwm2 - pwm1) / (rate2 - rate1)
-            return pwm1 + slope * (target_rate - rate1)
-    # Clamp to min/max PWM if target_rate is outside calibration range
-    min_pwm, max_pwm = min(pwms), max(pwms)
-    if target_rate < cal_points[min_pwm]:
-        return min_pwm
-    return max_pwm
-
-def load_calibration_csv(cal_csv):
-    """Load calibration data from CSV with Valve and Avg quantity(g) columns."""
+def load_calibration_or_warn(cal_csv):
+    """Load calibration CSV, reporting failures through a dialog instead of raising."""
     try:
-        df = pd.read_csv(cal_csv)
-        if 'Valve' not in df.columns or 'Avg quantity(g)' not in df.columns:
-            messagebox.showerror("Error", "CSV must contain 'Valve' and 'Avg quantity(g)' columns")
-            return None
-        cal_points = {float(row['Valve']): float(row['Avg quantity(g)']) for _, row in df.iterrows()}
-        return cal_points
+        return load_calibration_csv(cal_csv)
     except Exception as e:
         messagebox.showerror("Error", f"Failed to read calibration CSV: {e}")
         return None
 
-def generate_waypoints(input_csv, altitude, speed, cal_points, valve_servo_channel, disc_servo_channel, disc_pwm, include_takeoff):
-    """Generate QGC WPL 110 waypoint lines from CSV input."""
-    try:
-        df = pd.read_csv(input_csv)
-    except Exception as e:
-        messagebox.showerror("Error", f"Failed to read CSV: {e}")
-        return []
-    waypoints = ["QGC WPL 110"]
-    seq = 0
-    # Add home position (MAV_CMD_NAV_WAYPOINT, 16) at mission start
-    home_lat, home_lon = 0.0, 0.0
-    if not df.empty:
-        first_coord = df.iloc[0]['Target Coordinates'].split(',')
-        if len(first_coord) == 2:
-            try:
-                home_lat = float(first_coord[0].strip())
-                home_lon = float(first_coord[1].strip())
-            except ValueError:
-                pass
-    waypoints.append(f"{seq}\t1\t0\t16\t0.00000000\t0.00000000\t0.00000000\t0.00000000\t{home_lat:.7f}\t{home_lon:.7f}\t{altitude:.6f}\t1")
-    seq += 1
-    if include_takeoff:
-        # Add takeoff command (MAV_CMD_NAV_TAKEOFF, 22)
-        waypoints.append(f"{seq}\t0\t3\t22\t20.00000000\t0.00000000\t0.00000000\t0.00000000\t0.00000000\t0.00000000\t{altitude:.6f}\t1")
-        seq += 1
-    # Initialize both servos to 1000 PWM before first waypoint
-    waypoints.append(f"{seq}\t0\t3\t183\t{disc_servo_channel:.8f}\t1000.00000000\t0.00000000\t0.00000000\t0.00000000\t0.00000000\t0.000000\t1")
-    seq += 1
-    waypoints.append(f"{seq}\t0\t3\t183\t{valve_servo_channel:.8f}\t1000.00000000\t1.00000000\t0.00000000\t0.00000000\t0.00000000\t0.000000\t1")
-    seq += 1
-    # Set disc speed PWM to user-specified value
-    disc_pwm = max(1000, min(2000, int(disc_pwm)))  # Clamp to 1000-2000us
-    waypoints.append(f"{seq}\t0\t3\t183\t{disc_servo_channel:.8f}\t{disc_pwm:.8f}\t0.00000000\t0.00000000\t0.00000000\t0.00000000\t0.000000\t1")
-    seq += 1
-    previous_coord = None
-    for idx, row in df.iterrows():
+def run_in_background(title, work, on_done, on_error=None):
+    """Run ``work(progress)`` on the worker thread behind a modal progress dialog.
+
+    The Tk loop polls the job with ``after()``; ``on_done(result)`` or
+    ``on_error(exception)`` is then called on the main thread. Cancel makes the
+    next ``progress`` call raise PlanCancelled, which ends the job silently.
+    """
+    cancel_event = threading.Event()
+    state = {'stage': None, 'done': 0, 'total': 0}
+    dialog = tk.Toplevel(root)
+    dialog.title(title)
+    dialog.geometry("420x140")
+    dialog.transient(root)
+    dialog.grab_set()
+    status = ttk.Label(dialog, text="Starting...", font=('Helvetica', 11))
+    status.pack(pady=10)
+    bar = ttk.Progressbar(dialog, mode='determinate', length=360)
+    bar.pack(pady=5)
+    ttk.Button(dialog, text="Cancel", bootstyle="danger", command=cancel_event.set).pack(pady=5)
+    dialog.protocol("WM_DELETE_WINDOW", cancel_event.set)
+
+    def progress(stage, done, total):
+        if cancel_event.is_set():
+            raise PlanCancelled()
+        state.update(stage=stage, done=done, total=total)
+
+    future = executor.submit(work, progress)
+
+    def poll():
+        if not future.done():
+            if cancel_event.is_set():
+                status.config(text="Cancelling...")
+            elif state['stage']:
+                status.config(text=f"{STAGE_LABELS.get(state['stage'], state['stage'])}: {state['done']:,} / {state['total']:,}")
+                bar.config(maximum=max(state['total'], 1), value=state['done'])
+            root.after(100, poll)
+            return
+        dialog.grab_release()
+        dialog.destroy()
         try:
-            grams = float(row['Fertilizer'])
-            latlon = row['Target Coordinates'].split(',')
-            if len(latlon) != 2:
-                continue
-            lat = float(latlon[0].strip())
-            lon = float(latlon[1].strip())
-            current_coord = (lat, lon)
-            time_seconds = 1.0  # Default time if no previous coord
-            if previous_coord:
-                distance_m = geodesic(previous_coord, current_coord).meters
-                time_seconds = distance_m / speed if speed > 0 else 1.0
-            pwm = interpolate_pwm(grams, time_seconds, cal_points)
-            pwm = max(min(cal_points.keys(), default=1000), min(max(cal_points.keys(), default=2000), int(pwm)))
-            # Add waypoint (MAV_CMD_NAV_WAYPOINT, 16)
-            waypoints.append(f"{seq}\t0\t3\t16\t0.00000000\t0.00000000\t0.00000000\t0.00000000\t{lat:.7f}\t{lon:.7f}\t{altitude:.6f}\t1")
-            seq += 1
-            # Add servo command (MAV_CMD_DO_SET_SERVO, 183)
-            waypoints.append(f"{seq}\t0\t3\t183\t{valve_servo_channel:.8f}\t{pwm:.8f}\t1.00000000\t0.00000000\t0.00000000\t0.00000000\t0.000000\t1")
-            seq += 1
-            previous_coord = current_coord
+            result = future.result()
+        except PlanCancelled:
+            return
         except Exception as e:
-            print(f"Skipping row {idx} due to error: {e}")
-            continue
-    # Set both servos back to 1000 PWM after last waypoint
-    waypoints.append(f"{seq}\t0\t3\t183\t{valve_servo_channel:.8f}\t1000.00000000\t1.00000000\t0.00000000\t0.00000000\t0.00000000\t0.000000\t1")
-    seq += 1
-    waypoints.append(f"{seq}\t0\t3\t183\t{disc_servo_channel:.8f}\t1000.00000000\t0.00000000\t0.00000000\t0.00000000\t0.00000000\t0.000000\t1")
-    return waypoints
+            if on_error:
+                on_error(e)
+            else:
+                messagebox.showerror("Error", str(e))
+            return
+        if not cancel_event.is_set():
+            on_done(result)
+
+    root.after(100, poll)
 
 def browse_file():
     """Open file dialog to select waypoint CSV file."""
@@ -130,14 +113,6 @@ def browse_cal_file():
         cal_file_entry.delete(0, tk.END)
         cal_file_entry.insert(0, filepath)
 
-def parse_coordinate(coord_str):
-    """Parse 'lat,lon' string into coordinates."""
-    try:
-        lat, lon = map(float, coord_str.split(','))
-        return (lon, lat)
-    except:
-        return None
-
 def visualize_waypoints(save_path=None):
     """Visualize waypoints with color-coded fertilizer quantities and PWM annotations."""
     try:
@@ -145,78 +120,57 @@ def visualize_waypoints(save_path=None):
         if not input_path:
             messagebox.showerror("Error", "Please select a waypoint CSV file")
             return
-        df = pd.read_csv(input_path)
         cal_path = cal_file_entry.get()
-        cal_points = load_calibration_csv(cal_path) if cal_path else None
+        cal_points = load_calibration_or_warn(cal_path) if cal_path else None
         speed = float(speed_entry.get())
         disc_pwm = float(disc_pwm_entry.get())
-        altitude = float(alt_entry.get())  # Not used here but for consistency
+        altitude = float(alt_entry.get())
+        valve_servo_channel = int(valve_servo_var.get())
+        disc_servo_channel = int(disc_servo_var.get())
+        include_takeoff = include_takeoff_var.get()
+        route_mode = route_var.get()
+        disc_label = disc_pwm
         if cal_points is None:
             messagebox.showwarning("Warning", "Calibration file not loaded. PWMs will not be shown.")
-            disc_pwm = max(1000, min(2000, int(disc_pwm)))
-        fig, ax = plt.subplots(figsize=(10, 8))
-        lons, lats, grams, pwms = [], [], [], []
-        previous_coord = None
-        for i, row in df.iterrows():
-            coord = parse_coordinate(row['Target Coordinates'])
-            if coord:
-                lon, lat = coord
-                lons.append(lon)
-                lats.append(lat)
-                gram = float(row['Fertilizer'])
-                grams.append(gram)
-                if cal_points:
-                    current_coord = (lat, lon)
-                    time_seconds = 1.0
-                    if previous_coord:
-                        distance_m = geodesic(previous_coord, current_coord).meters
-                        time_seconds = distance_m / speed if speed > 0 else 1.0
-                    pwm = interpolate_pwm(gram, time_seconds, cal_points)
-                    pwm = max(min(cal_points.keys(), default=1000), min(max(cal_points.keys(), default=2000), int(pwm)))
-                    pwms.append(pwm)
-                    previous_coord = current_coord
-                else:
-                    pwms.append(None)
-        if lons and lats and grams:
-            norm = Normalize(vmin=min(grams), vmax=max(grams))
-            cmap = plt.get_cmap('RdBu')
-            scatter = ax.scatter(lons, lats, c=grams, cmap=cmap, norm=norm, s=100, edgecolors='black', linewidth=0.5)
-            for i, (lon, lat, pwm) in enumerate(zip(lons, lats, pwms)):
-                text = f"{i+1}"
-                if pwm is not None:
-                    text += f": {pwm}"
-                ax.text(lon, lat, text, fontsize=10, ha='center', va='bottom', color='darkblue')
-            cbar = fig.colorbar(ScalarMappable(norm=norm, cmap=cmap), ax=ax)
-            cbar.set_label('Fertilizer Quantity (g)', fontsize=12)
-            ax.text(min(lons), max(lats), f"Disc PWM: {disc_pwm}", ha='left', va='top', fontsize=12, color='red')
-        # Set tighter axis limits with padding
-        if lons and lats:
-            lon_range = max(lons) - min(lons)
-            lat_range = max(lats) - min(lats)
-            padding = 0.05 * max(lon_range, lat_range)
-            ax.set_xlim(min(lons) - padding, max(lons) + padding)
-            ax.set_ylim(min(lats) - padding, max(lats) + padding)
-        ax.set_title("Fertilizer Waypoints with Quantity Coloring and PWMs", fontsize=16, weight='bold', color='navy')
-        ax.set_xlabel("Longitude", fontsize=12)
-        ax.set_ylabel("Latitude", fontsize=12)
-        ax.grid(True, linestyle='--', alpha=0.7)
+            disc_label = max(1000, min(2000, int(disc_pwm)))
+    except Exception as e:
+        messagebox.showerror("Plot Error", str(e))
+        return
+
+    def work(progress):
+        # Same cache key as run(), so plotting, exporting and generating share one plan
+        plan = get_plan(input_path, altitude, speed, cal_points, valve_servo_channel, disc_servo_channel, disc_pwm, include_takeoff,
+                        progress=progress, route_mode=route_mode)
         if save_path:
+            # Export renders off the Tk thread on a pyplot-free figure
+            fig = Figure(figsize=(10, 8))
+            plot_plan(plan, disc_label, fig=fig)
             fig.savefig(save_path, dpi=300, bbox_inches='tight')
-            plt.close(fig)
+        return plan
+
+    def done(plan):
+        warn_rejects(plan.rejects)
+        if save_path:
             messagebox.showinfo("Exported", f"Visualization saved to:\n{save_path}")
         else:
+            plot_plan(plan, disc_label)
             plt.show()
-    except Exception as e:
-        messagebox.showerror("Plot Error", str(e))
+
+    run_in_background("Exporting" if save_path else "Planning", work, done,
+                      lambda e: messagebox.showerror("Plot Error", str(e)))
 
 def visualize_calibration():
     """Visualize calibration data from CSV as a line plot."""
+    cal_csv = cal_file_entry.get()
+    if not cal_csv:
+        messagebox.showerror("Error", "Please select a calibration CSV file")
+        return
+    run_in_background("Loading calibration", lambda progress: pd.read_csv(cal_csv), plot_calibration,
+                      lambda e: messagebox.showerror("Plot Error", str(e)))
+
+def plot_calibration(df):
+    """Plot a loaded calibration DataFrame."""
     try:
-        cal_csv = cal_file_entry.get()
-        if not cal_csv:
-            messagebox.showerror("Error", "Please select a calibration CSV file")
-            return
-        df = pd.read_csv(cal_csv)
         if 'Valve' not in df.columns or 'Avg quantity(g)' not in df.columns:
             messagebox.showerror("Error", "CSV must contain 'Valve' and 'Avg quantity(g)' columns")
             return
@@ -249,28 +203,46 @@ def export_visualization():
     if file_path:
         visualize_waypoints(file_path)
 
-def save_waypoints(content, output_path):
-    with open(output_path, 'w') as outfile:
-        outfile.write(content)
+def save_waypoints(store, output_path):
+    """Commit pending edits and stream the edited mission to disk."""
+    store.save(output_path)
     messagebox.showinfo("Success", f"Waypoints saved to {output_path}")
 
-def preview_waypoints(waypoints, output_path):
+def warn_rejects(rejects):
+    """Tell the user which CSV rows were left out of the plan, if any."""
+    if rejects is not None and len(rejects):
+        messagebox.showwarning("Rows skipped", "\n".join([str(rejects)] + rejects.details()))
+
+def preview_waypoints(store, output_path, notes=()):
+    """Open the virtualized preview/editor for a MissionStore; ``notes`` (route, compaction) go in the title."""
     preview_window = tk.Toplevel(root)
-    preview_window.title("Waypoint Preview and Editor")
+    preview_window.title("Waypoint Preview and Editor" + (f" ({'; '.join(notes)})" if notes else ""))
     preview_window.geometry("800x600")
-    text = tk.Text(preview_window, wrap='none', font=('Courier', 10))
-    text.insert(tk.END, '\n'.join(waypoints))
-    text.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-    yscroll = tk.Scrollbar(preview_window, command=text.yview)
-    yscroll.pack(side=tk.RIGHT, fill=tk.Y)
-    text.config(yscrollcommand=yscroll.set)
-    xscroll = tk.Scrollbar(preview_window, orient='horizontal', command=text.xview)
-    xscroll.pack(side=tk.BOTTOM, fill=tk.X)
-    text.config(xscrollcommand=xscroll.set)
     btn_frame = ttk.Frame(preview_window)
-    btn_frame.pack(pady=10)
-    save_btn = ttk.Button(btn_frame, text="Save", bootstyle="success", command=lambda: [save_waypoints(text.get("1.0", tk.END), output_path), preview_window.destroy()])
+    btn_frame.pack(side=tk.BOTTOM, pady=10)
+    preview = VirtualPreview(preview_window, store)
+
+    def save():
+        preview.commit()
+        save_waypoints(store, output_path)
+        preview_window.destroy()
+
+    def upload():
+        preview.commit()
+        connection = simpledialog.askstring("Upload to Autopilot", "Connection (udpin:HOST:PORT, udpout:HOST:PORT or serial port[:baud]):",
+                                            initialvalue=DEFAULT_CONNECTION, parent=preview_window)
+        if not connection:
+            return
+        # Parsing a large mission takes seconds, so it runs on the worker too (the progress dialog is modal)
+        run_in_background("Uploading mission",
+                          lambda progress: send_mission(connection, mission_items(store.iter_lines()), progress=progress),
+                          lambda stats: messagebox.showinfo("Uploaded", f"Mission uploaded: {stats}"),
+                          lambda e: messagebox.showerror("Upload Error", str(e)))
+
+    save_btn = ttk.Button(btn_frame, text="Save", bootstyle="success", command=save)
     save_btn.pack(side=tk.LEFT, padx=10)
+    upload_btn = ttk.Button(btn_frame, text="Upload to Autopilot", bootstyle="info", command=upload)
+    upload_btn.pack(side=tk.LEFT, padx=10)
     cancel_btn = ttk.Button(btn_frame, text="Cancel", bootstyle="danger", command=preview_window.destroy)
     cancel_btn.pack(side=tk.LEFT, padx=10)
 
@@ -285,7 +257,10 @@ def run():
         disc_servo_channel = int(disc_servo_var.get())
         disc_pwm = float(disc_pwm_entry.get())
         include_takeoff = include_takeoff_var.get()
-        cal_points = load_calibration_csv(cal_path)
+        route_mode = route_var.get()
+        compact = compact_var.get()
+        merge_tolerance_m = float(merge_tol_entry.get()) if merge_tol_entry.get().strip() else None
+        cal_points = load_calibration_or_warn(cal_path)
         if cal_points is None:
             return
     except ValueError:
@@ -294,14 +269,31 @@ def run():
     output_path = filedialog.asksaveasfilename(defaultextension=".waypoints",
                     filetypes=[("Waypoint files", "*.waypoints")])
     if output_path:
-        waypoints = generate_waypoints(input_path, altitude, speed, cal_points, valve_servo_channel, disc_servo_channel, disc_pwm, include_takeoff)
-        preview_waypoints(waypoints, output_path)
+        def work(progress):
+            plan = get_plan(input_path, altitude, speed, cal_points, valve_servo_channel, disc_servo_channel, disc_pwm, include_takeoff,
+                            progress=progress, route_mode=route_mode)
+            plan.point_items(progress)  # Format items here so the preview opens instantly
+            notes = [str(plan.route_stats)] if plan.route_stats else []
+            if len(plan.rejects):
+                notes.append(str(plan.rejects))
+            if not compact:
+                return MissionStore(PlanLines(plan)), notes, plan.rejects
+            stats = CompactionStats()
+            store = MissionStore(list(compact_lines(plan.iter_lines(), merge_tolerance_m, stats)))
+            return store, notes + [f"compacted: {stats}"], plan.rejects
+
+        def done(result):
+            store, notes, rejects = result
+            preview_waypoints(store, output_path, notes)
+            warn_rejects(rejects)
+        run_in_background("Generating waypoints", work, done,
+                          lambda e: messagebox.showerror("Error", f"Failed to read CSV: {e}"))
 
 # ------------------ Modern GUI ------------------ #
 style = Style(theme='flatly')
 root = style.master
 root.title("RSSA Waypoint Gen V1.0")
-root.geometry("900x600")
+root.geometry("900x760")
 root.configure(bg='#FFFFFF')
 # Set application icon
 try:
@@ -384,6 +376,18 @@ disc_pwm_entry.grid(row=7, column=1, sticky='w', padx=10)
 ttk.Label(frame, text="Include Takeoff Command:", font=('Helvetica', 12), foreground='#1E3A8A').grid(row=8, column=0, sticky='e', pady=10)
 include_takeoff_var = tk.BooleanVar(value=True)
 ttk.Checkbutton(frame, variable=include_takeoff_var, bootstyle="round-toggle").grid(row=8, column=1, sticky='w', padx=10)
+# Compaction
+ttk.Label(frame, text="Compact Mission:", font=('Helvetica', 12), foreground='#1E3A8A').grid(row=9, column=0, sticky='e', pady=10)
+compact_var = tk.BooleanVar(value=False)
+ttk.Checkbutton(frame, variable=compact_var, bootstyle="round-toggle").grid(row=9, column=1, sticky='w', padx=10)
+ttk.Label(frame, text="Merge Tolerance (m, blank = off):", font=('Helvetica', 12), foreground='#1E3A8A').grid(row=10, column=0, sticky='e', pady=10)
+merge_tol_entry = ttk.Entry(frame, width=10, font=('Helvetica', 11))
+merge_tol_entry.grid(row=10, column=1, sticky='w', padx=10)
+# Visit order
+ttk.Label(frame, text="Visit Order:", font=('Helvetica', 12), foreground='#1E3A8A').grid(row=11, column=0, sticky='e', pady=10)
+route_var = tk.StringVar(value="csv")
+route_dropdown = ttk.Combobox(frame, textvariable=route_var, values=list(ROUTE_MODES), state='readonly', width=14, font=('Helvetica', 11))
+route_dropdown.grid(row=11, column=1, sticky='w', padx=10)
 # Buttons (light blue)
 btn_frame = ttk.Frame(frame, style='light.TFrame')
 btn_frame.grid(row=100, column=0, columnspan=5, pady=30, sticky='ew')